@@ -0,0 +1,87 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2022  CZ.NIC, z. s. p. o.
+#
+# This file is part of FRED.
+#
+# FRED is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# FRED is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with FRED.  If not, see <https://www.gnu.org/licenses/>.
+"""Benchmark of property conversion on EPP-like payloads.
+
+Compares PropertyConverter with the previous recursive conversion.
+The equality of their output is tested in pylogger/tests/test_conversion.py.
+
+Usage:
+    python benchmarks/conversion.py [number of conversions]
+"""
+from __future__ import print_function, unicode_literals
+
+import datetime
+import sys
+import timeit
+
+import six
+from fred_idl import ccReg
+from pyfco import u2c
+
+from pylogger.conversion import PropertyConverter
+
+
+def _legacy_convert_nested_to_str(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if not isinstance(value, list) and not isinstance(value, tuple):
+        return six.text_type(value)
+    return [_legacy_convert_nested_to_str(item) for item in value]
+
+
+def _legacy_convert_properties(properties):
+    """Convert properties the way Logger.convert_properties did before PropertyConverter."""
+    converted_properties = []
+    for prop in properties or ():
+        name, value = prop[0], prop[1]
+        child = prop[2] if len(prop) > 2 else False
+        if not isinstance(name, six.string_types):
+            name = six.text_type(name)
+        if not isinstance(value, six.string_types):
+            value = six.text_type(_legacy_convert_nested_to_str(value))
+        converted_properties.append(ccReg.RequestProperty(u2c(name), u2c(value), child))
+    return converted_properties
+
+
+def nsset_update(hosts):
+    """Return properties of EPP NSsetUpdate with the number of added hosts."""
+    properties = [['command', 'nsset:update'], ['clTRID', 'ABC-12345'], ['handle', 'NSSID:EXAMPLE']]
+    for index in range(hosts):
+        properties.append(['add.ns', 'ns%d.example.cz' % index])
+        properties.append(['add.ns.addr', ['192.0.2.%d' % (index % 256), '2001:db8::%x' % index], True])
+    properties.append(['add.tech', ('CID-TECH1', 'CID-TECH2')])
+    properties.append(['rem.ns', [['ns-old.example.cz', ['198.51.100.1']]]])
+    properties.append(['reportLevel', 5])
+    properties.append(['crDate', datetime.datetime(2022, 1, 12, 10, 30)])
+    return properties
+
+
+def main(number):
+    converter = PropertyConverter()
+    print('properties  legacy [us]  converter [us]')
+    for hosts in (1, 10, 100):
+        properties = nsset_update(hosts)
+        legacy_time = min(timeit.repeat(lambda: _legacy_convert_properties(properties), number=number, repeat=3))
+        new_time = min(timeit.repeat(lambda: converter.convert_properties(properties), number=number, repeat=3))
+        print('%10d  %11.2f  %14.2f' % (len(properties), legacy_time / number * 1e6, new_time / number * 1e6))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
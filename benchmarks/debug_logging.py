@@ -0,0 +1,68 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2022  CZ.NIC, z. s. p. o.
+#
+# This file is part of FRED.
+#
+# FRED is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# FRED is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with FRED.  If not, see <https://www.gnu.org/licenses/>.
+"""Microbenchmark of debug logging overhead in createRequest and closeRequest.
+
+Compares a create/close cycle, where debug logging is disabled, with the cost of eager formatting
+of the debug messages, which was done on every request before.
+
+Usage:
+    python benchmarks/debug_logging.py [number of requests]
+"""
+from __future__ import print_function, unicode_literals
+
+import logging
+import sys
+import timeit
+
+from pylogger.corbalogger import Logger
+from pylogger.fakedao import FakeDao
+
+
+def _properties(count):
+    return [['name%d' % i, 'value %d' % i, bool(i % 2)] for i in range(count)]
+
+
+def main(number):
+    logging.basicConfig(level=logging.WARNING)
+    logger = Logger(FakeDao(track=False))
+    print('properties  create+close [us]  eager debug format [us]')
+    for count in (0, 10, 100, 500):
+        properties = _properties(count)
+
+        def cycle():
+            request = logger.create_request('127.0.0.1', 'EPP', 'NSsetUpdate', properties)
+            request.close(result='Success', properties=properties)
+
+        converted = logger.convert_properties(properties)
+
+        def eager_format():
+            # Formatting done by every create and close before the debug messages were deferred.
+            create_message = "<Logger %s> createRequest %s %s %s %s %s %s %s" % (
+                id(logger), '127.0.0.1', 1, '', converted, [], 1, 0)
+            close_message = "<Logger %s> closeRequest %s %s %s %s %s %s" % (id(logger), 1, '', converted, [], 1000, 0)
+            return create_message, close_message
+
+        cycle_time = min(timeit.repeat(cycle, number=number, repeat=3)) / number
+        format_time = min(timeit.repeat(eager_format, number=number, repeat=3)) / number
+        print('%10d  %17.2f  %23.2f' % (count, cycle_time * 1e6, format_time * 1e6))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
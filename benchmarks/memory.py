@@ -0,0 +1,85 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2022  CZ.NIC, z. s. p. o.
+#
+# This file is part of FRED.
+#
+# FRED is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# FRED is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with FRED.  If not, see <https://www.gnu.org/licenses/>.
+"""Memory benchmark of in-flight requests.
+
+Reports bytes allocated per request, which is created and not closed yet.
+
+Requires Python 3.4 or newer.
+
+Usage:
+    python benchmarks/memory.py [number of requests]
+"""
+from __future__ import division, print_function, unicode_literals
+
+import shutil
+import sys
+import tempfile
+import tracemalloc
+
+from pylogger.background import BackgroundLogger
+from pylogger.corbalogger import Logger, LoggerFailSilent
+from pylogger.fakedao import FakeDao
+from pylogger.sampling import NonDefaultResultOnly
+from pylogger.spool import Spool, SpoolingLogger
+
+
+def _measure(create, number):
+    """Return number of bytes allocated per object returned by create."""
+    create()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        objects = [create() for _ in range(number)]
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    # Don't count the list itself.
+    size -= sys.getsizeof(objects)
+    return size / number
+
+
+def main(number):
+    logger = Logger(FakeDao(track=False))
+    fail_silent_logger = LoggerFailSilent(FakeDao(track=False))
+    sampling_logger = Logger(FakeDao(track=False), policies={('EPP', None): NonDefaultResultOnly()})
+    # Without workers, the queued create is counted as well.
+    background_logger = BackgroundLogger(FakeDao(track=False), queue_size=number + 1, workers=0)
+    spool_directory = tempfile.mkdtemp()
+    spooling_logger = SpoolingLogger(FakeDao(track=False), Spool(spool_directory))
+    cases = (
+        ('LogRequest', lambda: logger.create_request('127.0.0.1', 'EPP', 'DomainInfo')),
+        ('LogRequestFailSilent', lambda: fail_silent_logger.create_request('127.0.0.1', 'EPP', 'DomainInfo')),
+        ('DeferredLogRequest', lambda: logger.create_request('127.0.0.1', 'EPP', 'DomainInfo', deferred=True)),
+        ('ConditionalLogRequest', lambda: sampling_logger.create_request('127.0.0.1', 'EPP', 'DomainInfo')),
+        ('BackgroundLogRequest', lambda: background_logger.create_request('127.0.0.1', 'EPP', 'DomainInfo')),
+        ('SpoolLogRequest', lambda: spooling_logger.create_request('127.0.0.1', 'EPP', 'DomainInfo')),
+        ('DummyLogRequest', logger.create_dummy_request),
+    )
+    print('request                  bytes per request')
+    try:
+        for name, create in cases:
+            print('%-22s  %19.1f' % (name, _measure(create, number)))
+    finally:
+        shutil.rmtree(spool_directory)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -0,0 +1,160 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2022  CZ.NIC, z. s. p. o.
+#
+# This file is part of FRED.
+#
+# FRED is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# FRED is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with FRED.  If not, see <https://www.gnu.org/licenses/>.
+"""Benchmark suite of the logger with an in-process fake DAO.
+
+Reports operations per second and p50/p99 latency of each benchmark.
+
+Usage:
+    python benchmarks/suite.py [--json] [--number NUMBER] [--latency SECONDS] [BENCHMARK ...]
+"""
+from __future__ import division, print_function, unicode_literals
+
+import argparse
+import json
+import sys
+import threading
+from timeit import default_timer
+
+from pylogger.corbalogger import Logger
+from pylogger.fakedao import FakeDao
+
+
+def _properties(count, depth):
+    """Return properties with values nested to the depth."""
+    properties = []
+    for index in range(count):
+        value = 'value %d' % index
+        for _ in range(depth):
+            value = [value, index]
+        properties.append(['name%d' % index, value, bool(index % 2)])
+    return properties
+
+
+def _percentile(durations, percentile):
+    return durations[min(len(durations) - 1, int(len(durations) * percentile / 100))]
+
+
+def _measure(operation, number, threads=1):
+    """Run the operation number times in each thread and return the results."""
+    durations = []
+    lock = threading.Lock()
+
+    def run():
+        local = []
+        for _ in range(number):
+            start = default_timer()
+            operation()
+            local.append(default_timer() - start)
+        with lock:
+            durations.extend(local)
+
+    workers = [threading.Thread(target=run) for _ in range(threads)]
+    start = default_timer()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = default_timer() - start
+    durations.sort()
+    return {'ops_per_sec': len(durations) / elapsed,
+            'p50_us': _percentile(durations, 50) * 1e6,
+            'p99_us': _percentile(durations, 99) * 1e6}
+
+
+def bench_startup(number, latency):
+    """Logger startup with many services."""
+    for services in (10, 100):
+        names = ['Service%d' % index for index in range(services)]
+        yield 'services=%d' % services, _measure(lambda: Logger(FakeDao(services=names, latency=latency)), number)
+
+
+def bench_create_close(number, latency):
+    """Create and close requests with various numbers of properties and nesting depths."""
+    logger = Logger(FakeDao(latency=latency, track=False))
+    for count in (0, 10, 100):
+        for depth in (0, 2, 4):
+            if count == 0 and depth:
+                continue
+            properties = _properties(count, depth)
+
+            def cycle():
+                request = logger.create_request('127.0.0.1', 'EPP', 'NSsetUpdate', properties)
+                request.close(result='Success', properties=properties)
+
+            yield 'properties=%d depth=%d' % (count, depth), _measure(cycle, number)
+
+
+def bench_sessions(number, latency):
+    """Session churn - start a session, log a request in it and close it."""
+    logger = Logger(FakeDao(latency=latency, track=False))
+
+    def churn():
+        session_id = logger.start_session(1, 'REG-EXAMPLE')
+        logger.create_request('127.0.0.1', 'EPP', 'Login', session_id=session_id).close(result='Success')
+        logger.close_session(session_id)
+
+    yield 'session', _measure(churn, number)
+
+
+def bench_contention(number, latency):
+    """Create and close requests from many threads sharing one logger."""
+    logger = Logger(FakeDao(latency=latency, track=False))
+    properties = _properties(10, 1)
+
+    def cycle():
+        logger.create_request('127.0.0.1', 'EPP', 'DomainCreate', properties).close(result='Success')
+
+    for threads in (1, 4, 16):
+        yield 'threads=%d' % threads, _measure(cycle, number, threads)
+
+
+BENCHMARKS = {
+    'startup': bench_startup,
+    'create_close': bench_create_close,
+    'sessions': bench_sessions,
+    'contention': bench_contention,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('benchmarks', nargs='*', help='benchmarks to run, all by default: %s' % ', '.join(
+        sorted(BENCHMARKS)))
+    parser.add_argument('--number', type=int, default=1000, help='number of operations in each benchmark')
+    parser.add_argument('--latency', type=float, default=0, help='latency of each DAO call in seconds')
+    parser.add_argument('--json', action='store_true', help='print results as JSON lines')
+    args = parser.parse_args(argv)
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error('unknown benchmarks: %s' % ', '.join(sorted(unknown)))
+
+    for name in args.benchmarks or sorted(BENCHMARKS):
+        number = max(1, args.number // 100) if name == 'startup' else args.number
+        for case, result in BENCHMARKS[name](number, args.latency):
+            if args.json:
+                print(json.dumps(dict(result, benchmark=name, case=case)))
+            else:
+                print('%-14s %-24s %12.1f ops/s  p50 %10.1f us  p99 %10.1f us' % (
+                    name, case, result['ops_per_sec'], result['p50_us'], result['p99_us']))
+            sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+#
+# Copyright (C) 2022  CZ.NIC, z. s. p. o.
+#
+# This file is part of FRED.
+#
+# FRED is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# FRED is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with FRED.  If not, see <https://www.gnu.org/licenses/>.
+"""Asyncio logger, which runs the blocking calls in an executor.
+
+Requires Python 3.7 or newer.
+"""
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from .corbalogger import LoggerFailSilent
+
+__all__ = ["AsyncLogger", "AsyncLogRequest"]
+
+
+class AsyncLogger(object):
+    """Asyncio wrapper of a Logger.
+
+    Blocking calls of the wrapped logger run in an executor, at most `max_concurrency` of them at once.
+    Wrap a LoggerFailSilent to get its fail-silent semantics.
+
+    Example:
+        logger = await AsyncLogger.create(dao)
+        async with await logger.create_request("127.0.0.1", "RDAP", "DomainLookup", props) as req:
+            PERFORM_ACTION()
+            req.result = 'Ok'
+
+    On exception, the request is closed with its default result, even if the `result` was already set.
+    """
+
+    def __init__(self, logger, executor=None, max_concurrency=10):
+        """Init AsyncLogger.
+
+        Arguments:
+            logger: Logger to be wrapped.
+            executor: Executor for the blocking calls. By default, a thread pool of `max_concurrency` threads.
+            max_concurrency: Maximal number of blocking calls running at once.
+        """
+        self.logger = logger
+        self.max_concurrency = max_concurrency
+        self._own_executor = executor is None
+        self.executor = ThreadPoolExecutor(max_concurrency) if executor is None else executor
+        self._semaphore = None
+
+    @classmethod
+    async def create(cls, dao, logger_class=LoggerFailSilent, executor=None, max_concurrency=10, **kwargs):
+        """Create the logger in the executor, since it loads type codes from the server.
+
+        Arguments:
+            dao: Data Access Object for the logger.
+            logger_class: Class of the wrapped logger.
+            executor: Executor for the blocking calls.
+            max_concurrency: Maximal number of blocking calls running at once.
+            kwargs: Other arguments passed to the logger.
+        """
+        async_logger = cls(None, executor=executor, max_concurrency=max_concurrency)
+        async_logger.logger = await async_logger._run(logger_class, dao, **kwargs)
+        return async_logger
+
+    async def start_session(self, user_id, username):
+        """Start a new logging session."""
+        return await self._run(self.logger.start_session, user_id, username)
+
+    async def acquire_session(self, user_id, username):
+        """Return ID of an open session of the user, start a new one if necessary."""
+        return await self._run(self.logger.acquire_session, user_id, username)
+
+    async def release_session(self, session_id):
+        """Release the session acquired by acquire_session."""
+        await self._run(self.logger.release_session, session_id)
+
+    async def create_request(self, source_ip, service_name, request_type_name,
+                             properties=None, references=None, session_id=None,
+                             default_result=None, content='', deferred=False):
+        """Create a request object on the server.
+
+        If deferred, the request is created only when it's closed, in the executor. Reading request_id of
+        a deferred request before close creates it in the event loop thread, which blocks the loop.
+        Returns a new AsyncLogRequest object.
+        """
+        request = await self._run(
+            self.logger.create_request, source_ip, service_name, request_type_name, properties=properties,
+            references=references, session_id=session_id, default_result=default_result, content=content,
+            deferred=deferred)
+        return AsyncLogRequest(self, request)
+
+    def create_dummy_request(self, *args, **kwargs):
+        return AsyncLogRequest(self, self.logger.create_dummy_request(*args, **kwargs))
+
+    async def close_session(self, session_id):
+        """Tell the server to close this logging session."""
+        await self._run(self.logger.close_session, session_id)
+
+    def close(self, wait=True):
+        """Shut down the executor, if it's owned by the logger."""
+        if self._own_executor:
+            self.executor.shutdown(wait=wait)
+
+    async def _run(self, function, *args, **kwargs):
+        """Run the blocking function in the executor."""
+        if self._semaphore is None:
+            # Create the semaphore inside of the event loop.
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, functools.partial(function, *args, **kwargs))
+
+
+class AsyncLogRequest(object):
+    """Asyncio wrapper of a LogRequest.
+
+    Used as an async context manager, the request is closed on exit. On exception, it's closed with its default
+    result, which overrides the `result` set before the exception.
+    """
+
+    def __init__(self, async_logger, request):
+        self.async_logger = async_logger
+        self.request = request
+        self.default_result = request.result
+
+    @property
+    def request_id(self):
+        return self.request.request_id
+
+    @property
+    def service(self):
+        return self.request.service
+
+    @property
+    def request_type(self):
+        return self.request.request_type
+
+    @property
+    def result(self):
+        return self.request.result
+
+    @result.setter
+    def result(self, value):
+        self.request.result = value
+
+    async def add_properties(self, properties):
+        """Add output properties of this request."""
+        await self.async_logger._run(self.request.add_properties, properties)
+
+    async def add_references(self, references):
+        """Add output references of this request."""
+        await self.async_logger._run(self.request.add_references, references)
+
+    async def close(self, result=None, content="", properties=None, references=None, session_id=None):
+        """Close this logging request."""
+        await self.async_logger._run(self.request.close, result=result, content=content, properties=properties,
+                                     references=references, session_id=session_id)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close(result=self.default_result if exc_type is not None else None)
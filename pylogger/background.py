@@ -0,0 +1,442 @@
+#
+# Copyright (C) 2022  CZ.NIC, z. s. p. o.
+#
+# This file is part of FRED.
+#
+# FRED is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# FRED is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with FRED.  If not, see <https://www.gnu.org/licenses/>.
+"""Logger which sends requests to the server from background threads."""
+from __future__ import unicode_literals
+
+import logging
+import threading
+import time
+from collections import deque
+
+from .corbalogger import Logger, LoggingException, LogRequest, RequestTemplate
+
+__all__ = ["BackgroundConditionalLogRequest", "BackgroundDeferredLogRequest", "BackgroundLogger",
+           "BackgroundLogRequest", "BackgroundOperation", "BackgroundRequestTemplate", "BLOCK", "DROP_OLDEST",
+           "SPILL"]
+
+LOGGER = logging.getLogger(__name__)
+
+# Backpressure policies - what to do when the queue is full.
+# Wait until there is a free space in the queue.
+BLOCK = 'block'
+# Drop the oldest queued operation.
+DROP_OLDEST = 'drop_oldest'
+# Hand the operation over to the spill handler.
+SPILL = 'spill'
+BACKPRESSURE_POLICIES = (BLOCK, DROP_OLDEST, SPILL)
+
+
+def _wait_for(condition, predicate, timeout=None):
+    """Wait on the acquired condition until the predicate is true.
+
+    Returns False on timeout. Waits forever if timeout is None.
+    """
+    deadline = None if timeout is None else time.time() + timeout
+    while not predicate():
+        if deadline is None:
+            condition.wait()
+        else:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+            condition.wait(remaining)
+    return True
+
+
+class BackgroundOperation(object):
+    """Operation waiting in the queue of BackgroundLogger.
+
+    Attributes:
+        name: Name of the operation, either 'create' or 'close'.
+        request: BackgroundLogRequest the operation belongs to.
+        args: Tuple of positional arguments of the operation.
+        kwargs: Dictionary of keyword arguments of the operation.
+    """
+
+    CREATE = 'create'
+    CLOSE = 'close'
+
+    def __init__(self, name, request, args=(), kwargs=None):
+        self.name = name
+        self.request = request
+        self.args = args
+        self.kwargs = kwargs or {}
+
+    def run(self):
+        """Perform the operation."""
+        if self.name == self.CREATE:
+            self.request._create(*self.args, **self.kwargs)
+        else:
+            self.request._close(*self.args, **self.kwargs)
+
+    def cancel(self):
+        """Cancel the operation, which will never be performed."""
+        if self.name == self.CREATE:
+            self.request._resolve(0)
+
+
+class BackgroundLogger(Logger):
+    """Logger which sends requests to the server from background threads.
+
+    Requests are only queued in `create_request` and `LogRequest.close`, worker threads send them to the server.
+    Request is closed only after it was created. The `request_id` of the created request blocks until
+    the request is created on the server. Request ID of requests which failed to be created is 0.
+
+    Arguments passed to `create_request` and `close` are converted in the worker threads,
+    they should not be modified by the caller afterwards.
+
+    Example:
+        logger = BackgroundLogger(dao, queue_size=1000, backpressure=DROP_OLDEST)
+        req = logger.create_request("127.0.0.1", "EPP", "DomainCreate", props)
+        req.result = 'Success'
+        req.close()
+        ...
+        logger.shutdown()
+
+    Attributes:
+        backpressure: Policy used when the queue is full.
+        dropped: Number of operations dropped by DROP_OLDEST policy.
+        spilled: Number of operations passed to the spill handler.
+    """
+
+    def __init__(self, dao, queue_size=1000, workers=1, backpressure=BLOCK, spill=None, request_id_timeout=None,
+                 **kwargs):
+        """Init BackgroundLogger.
+
+        Arguments:
+            dao: Data Access Object for the logger.
+            queue_size: Maximal number of operations waiting in the queue.
+            workers: Number of worker threads.
+            backpressure: Policy used when the queue is full - BLOCK, DROP_OLDEST or SPILL.
+            spill: Callable which receives the BackgroundOperation, which doesn't fit into the queue.
+                Only used with SPILL policy. By default, the operation is performed by the calling thread.
+            request_id_timeout: Number of seconds to wait for the request ID. Wait forever if None.
+            kwargs: Other arguments passed to Logger.
+        """
+        if backpressure not in BACKPRESSURE_POLICIES:
+            raise ValueError("Unknown backpressure policy '%s'." % backpressure)
+        Logger.__init__(self, dao, **kwargs)
+        self.backpressure = backpressure
+        self.spill = spill
+        self.request_id_timeout = request_id_timeout
+        self.dropped = 0
+        self.spilled = 0
+
+        self._queue = deque()
+        self._queue_size = queue_size
+        self._condition = threading.Condition()
+        # Condition shared by all requests, notified whenever a request ID is resolved.
+        self._resolved = threading.Condition()
+        # Number of operations queued or in progress.
+        self._unfinished = 0
+        self._shutdown = False
+        self._workers = []
+        self._start_workers(workers)
+
+    def create_request(self, source_ip, service_name, request_type_name,
+                       properties=None, references=None, session_id=None,
+                       default_result=None, content='', deferred=False):
+        """Queue the request to be created on the server.
+
+        If deferred, the create is queued only when the request is closed or its request_id is read.
+        Returns a new BackgroundLogRequest object.
+        """
+        default_result = self._get_default_result(service_name, default_result)
+        create_args = (source_ip, content, service_name, request_type_name, properties, references, session_id)
+        if self.policies:
+            sampled_request = self._sample_request(service_name, request_type_name, default_result, create_args)
+            if sampled_request is not None:
+                return sampled_request
+        if deferred:
+            # Fail on unknown codes right away, not on close.
+            self._get_request_type_code(service_name, request_type_name)
+            return BackgroundDeferredLogRequest(self, create_args, service_name, request_type_name, default_result)
+        log_request = BackgroundLogRequest(self, None, service_name, request_type_name, default_result)
+        self._submit(BackgroundOperation(BackgroundOperation.CREATE, log_request, create_args))
+        return log_request
+
+    def template(self, service_name, request_type_name, static_properties=None, static_references=None,
+                 default_result=None):
+        """Return a factory of requests of the service and request type, which are queued to be created."""
+        return BackgroundRequestTemplate(self, service_name, request_type_name, static_properties, static_references,
+                                         default_result)
+
+    def flush(self, timeout=None):
+        """Wait until all queued operations are finished.
+
+        Returns True if all operations finished, False on timeout.
+        """
+        with self._condition:
+            return _wait_for(self._condition, lambda: not self._unfinished, timeout)
+
+    def shutdown(self, wait=True, timeout=None):
+        """Stop accepting new operations and stop the workers once the queue is drained.
+
+        Arguments:
+            wait: Whether to wait for the workers to finish.
+            timeout: Number of seconds to wait for each worker. Wait forever if None.
+        """
+        with self._condition:
+            self._shutdown = True
+            self._condition.notify_all()
+        if wait:
+            for worker in self._workers:
+                worker.join(timeout)
+
+    def _conditional_request(self, policy, create_args, service_name, request_type_name, default_result,
+                             fail_silent):
+        return BackgroundConditionalLogRequest(self, policy, create_args, service_name, request_type_name,
+                                               default_result)
+
+    def _after_fork(self):
+        Logger._after_fork(self)
+        # Queued operations belong to the parent, which performs them. Its threads don't run in the child.
+        self._queue = deque()
+        self._condition = threading.Condition()
+        self._resolved = threading.Condition()
+        self._unfinished = 0
+        workers = len(self._workers)
+        self._workers = []
+        if not self._shutdown:
+            self._start_workers(workers)
+
+    def _start_workers(self, number):
+        for index in range(number):
+            worker = threading.Thread(target=self._work, name='pylogger-background-%d' % index)
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+
+    def _submit(self, operation):
+        """Put the operation into the queue according to the backpressure policy."""
+        with self._condition:
+            if self._shutdown:
+                raise LoggingException("Logger has been shut down.")
+            request = operation.request
+            overflow = len(self._queue) >= self._queue_size
+            if self.backpressure == BLOCK:
+                while len(self._queue) >= self._queue_size and not self._shutdown:
+                    self._condition.wait()
+                if self._shutdown:
+                    raise LoggingException("Logger has been shut down.")
+            elif self.backpressure == DROP_OLDEST and overflow:
+                self._queue.popleft().cancel()
+                self._unfinished -= 1
+                self.dropped += 1
+            elif self.backpressure == SPILL and (overflow or request._spilled):
+                # Once a create was spilled, the close has to follow it.
+                request._spilled = True
+                self.spilled += 1
+            if not request._spilled:
+                self._queue.append(operation)
+                self._unfinished += 1
+                self._condition.notify_all()
+                return
+        # Spill outside of the lock.
+        if self.spill is None:
+            operation.run()
+        else:
+            self.spill(operation)
+
+    def _work(self):
+        """Perform queued operations until shutdown."""
+        while True:
+            with self._condition:
+                while not self._queue and not self._shutdown:
+                    self._condition.wait()
+                if not self._queue:
+                    return
+                operation = self._queue.popleft()
+                self._condition.notify_all()
+            try:
+                operation.run()
+            except Exception as error:
+                LOGGER.error('Logger failed to perform background %s: %s.', operation.name, error)
+            finally:
+                with self._condition:
+                    self._unfinished -= 1
+                    self._condition.notify_all()
+
+
+class BackgroundLogRequest(LogRequest):
+    """A request for logging created by BackgroundLogger.
+
+    Request ID is available once the request is created on the server.
+    Requests waiting for their request ID share the condition of the logger, so they don't need a lock each.
+    """
+
+    __slots__ = ('_request_id', '_spilled')
+
+    def __init__(self, *args, **kwargs):
+        self._spilled = False
+        LogRequest.__init__(self, *args, **kwargs)
+
+    @property
+    def request_id(self):
+        """Return request ID, wait until the request is created on the server."""
+        if not self._wait_resolved(self.logger.request_id_timeout):
+            raise LoggingException("Request has not been created yet.")
+        return self._request_id
+
+    @request_id.setter
+    def request_id(self, value):
+        if value is None:
+            self._request_id = None
+            return
+        with self.logger._resolved:
+            self._request_id = value
+            self.logger._resolved.notify_all()
+
+    def close(self, result=None, content="", properties=None, references=None, session_id=None):
+        """Queue the request to be closed on the server."""
+        if result is not None:
+            self.result = result
+        self.logger._submit(BackgroundOperation(
+            BackgroundOperation.CLOSE, self, (),
+            {'content': content, 'properties': properties, 'references': references, 'session_id': session_id}))
+
+    def _resolve(self, request_id):
+        """Set the request ID of the created request."""
+        self.request_id = request_id
+
+    def _known_request_id(self):
+        return self._request_id
+
+    def _wait_resolved(self, timeout=None):
+        """Wait until the request ID is resolved. Returns False on timeout."""
+        if self._request_id is not None:
+            return True
+        with self.logger._resolved:
+            return _wait_for(self.logger._resolved, lambda: self._request_id is not None, timeout)
+
+    def _create(self, *args, **kwargs):
+        """Create the request on the server, by the template, if provided."""
+        template = kwargs.get('template')
+        try:
+            if template is None:
+                request_id = self.logger._server_create_request(*args)
+            else:
+                request_id = template._create_request_id(*args)
+        except Exception as error:
+            LOGGER.error('Logger failed to error during background create_request: %s.', error)
+            request_id = 0
+        self._resolve(request_id)
+
+    def _close(self, **kwargs):
+        """Close the request on the server, once it's created."""
+        self._wait_resolved()
+        if not self._request_id:
+            LOGGER.warning('Request %s-%s was not created, skipping close.', self.service, self.request_type)
+            return
+        LogRequest.close(self, **kwargs)
+
+
+class BackgroundRequestTemplate(RequestTemplate):
+    """RequestTemplate, which queues the requests to be created by BackgroundLogger.
+
+    Should NOT be instantiated directly; use BackgroundLogger.template.
+    """
+
+    request_class = BackgroundLogRequest
+
+    def __call__(self, source_ip, properties=None, references=None, session_id=None, content=''):
+        """Queue the request to be created on the server.
+
+        Properties and references are appended to the static ones.
+        Returns a new BackgroundLogRequest object.
+        """
+        sampled_request = self._sample_request(source_ip, properties, references, session_id, content)
+        if sampled_request is not None:
+            return sampled_request
+        log_request = self.request_class(self.logger, None, self.service, self.request_type, self.default_result)
+        self.logger._submit(BackgroundOperation(BackgroundOperation.CREATE, log_request,
+                                                (source_ip, properties, references, session_id, content),
+                                                {'template': self}))
+        return log_request
+
+
+class BackgroundDeferredLogRequest(BackgroundLogRequest):
+    """BackgroundLogRequest, which is queued to be created only when it's closed or its request_id is read.
+
+    Should NOT be instantiated directly; use BackgroundLogger.create_request with deferred=True.
+    """
+
+    __slots__ = ('create_args', 'default_result')
+
+    # Whether reading request_id queues the create of the request.
+    create_on_read = True
+
+    def __init__(self, logger, create_args, service, request_type, default_result):
+        BackgroundLogRequest.__init__(self, logger, None, service, request_type, default_result)
+        # Arguments of the create, until it's queued.
+        self.create_args = create_args
+        self.default_result = default_result
+
+    @property
+    def request_id(self):
+        """Return request ID, queue the create of the request if necessary and wait until it's created."""
+        if self.create_args is not None:
+            if not self.create_on_read:
+                return 0
+            self.flush()
+        return BackgroundLogRequest.request_id.fget(self)
+
+    @request_id.setter
+    def request_id(self, value):
+        BackgroundLogRequest.request_id.fset(self, value)
+
+    def flush(self):
+        """Queue the create of the request, unless it's queued already."""
+        if self.create_args is not None:
+            create_args, self.create_args = self.create_args, None
+            self.logger._submit(BackgroundOperation(BackgroundOperation.CREATE, self, create_args))
+
+    def close(self, result=None, content="", properties=None, references=None, session_id=None):
+        """Queue the request to be created, if necessary, and closed on the server."""
+        if result is not None:
+            self.result = result
+        if self.create_args is not None:
+            if not self._should_log():
+                self.create_args = None
+                self._resolve(0)
+                return
+            self.flush()
+        BackgroundLogRequest.close(self, content=content, properties=properties, references=references,
+                                   session_id=session_id)
+
+    def _should_log(self):
+        """Return whether the request, which is not created yet, should be logged on close."""
+        return True
+
+
+class BackgroundConditionalLogRequest(BackgroundDeferredLogRequest):
+    """BackgroundLogRequest, which is queued to be created on close, if its sampling policy decides so.
+
+    Its request ID is 0 until it's closed.
+    """
+
+    __slots__ = ('policy',)
+
+    create_on_read = False
+
+    def __init__(self, logger, policy, create_args, service, request_type, default_result):
+        BackgroundDeferredLogRequest.__init__(self, logger, create_args, service, request_type, default_result)
+        self.policy = policy
+
+    def _should_log(self):
+        return self.policy.decide_result(self.result, self.default_result)
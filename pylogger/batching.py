@@ -0,0 +1,225 @@
+#
+# Copyright (C) 2022  CZ.NIC, z. s. p. o.
+#
+# This file is part of FRED.
+#
+# FRED is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# FRED is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with FRED.  If not, see <https://www.gnu.org/licenses/>.
+"""Data Access Object which submits requests to the server in batches."""
+from __future__ import unicode_literals
+
+import logging
+import threading
+import time
+from collections import deque
+
+__all__ = ["BatchingDao", "BatchTimeoutError"]
+
+LOGGER = logging.getLogger(__name__)
+
+
+class BatchTimeoutError(Exception):
+    """Batched call wasn't sent in time."""
+
+
+class _PendingCall(object):
+    """Call waiting for the batch to be flushed."""
+
+    def __init__(self, method, args):
+        self.method = method
+        self.args = args
+        self.created = time.time()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+    def resolve(self, result=None, error=None):
+        self.result = result
+        self.error = error
+        self.done.set()
+
+
+class BatchingDao(object):
+    """Data Access Object which groups createRequest and closeRequest calls into batches.
+
+    Batch is flushed when it reaches `max_size` calls or when its oldest call waits for `max_delay` seconds,
+    whichever comes first. Only calls, for which the wrapped DAO provides a bulk method, are batched -
+    `createRequests` and `closeRequests` accept a list of argument tuples of the respective single call.
+    Calls without a bulk method are passed straight to the wrapped DAO from the calling thread, since sending them
+    one by one from the flushing thread would serialize calls of all threads.
+
+    `createRequest` blocks until the batch is flushed, since the request ID is required.
+    `closeRequest` only queues the call, errors are logged. `closeSession` flushes queued calls first, so it doesn't
+    overtake closes of requests of the session. All other calls are passed to the wrapped DAO.
+    Batching pays off when many threads log at once, e.g. together with `BackgroundLogger` with several workers.
+
+    Example:
+        logger = Logger(BatchingDao(dao, max_size=50, max_delay=0.01))
+    """
+
+    CREATE = 'createRequest'
+    CLOSE = 'closeRequest'
+    BULK_METHODS = {CREATE: 'createRequests', CLOSE: 'closeRequests'}
+
+    def __init__(self, dao, max_size=100, max_delay=0.05, timeout=None):
+        """Init BatchingDao.
+
+        Arguments:
+            dao: Data Access Object to be wrapped.
+            max_size: Maximal number of calls in a batch.
+            max_delay: Maximal number of seconds a call waits for the batch to be flushed.
+            timeout: Maximal number of seconds createRequest waits for the request ID. Waits forever if None.
+        """
+        self.dao = dao
+        self.max_size = max_size
+        self.max_delay = max_delay
+        self.timeout = timeout
+        # Methods, which are batched.
+        self.batched = frozenset(method for method, bulk_method in self.BULK_METHODS.items()
+                                 if getattr(dao, bulk_method, None) is not None)
+        self._pending = deque()
+        self._condition = threading.Condition()
+        # Number of calls taken from the queue, but not yet sent.
+        self._in_flight = 0
+        self._closed = False
+        self._flush_requested = False
+        self._flusher = None
+        if self.batched:
+            self._flusher = threading.Thread(target=self._run, name='pylogger-batching')
+            self._flusher.daemon = True
+            self._flusher.start()
+
+    def __getattr__(self, name):
+        return getattr(self.dao, name)
+
+    def createRequest(self, *args):
+        """Queue createRequest call and wait for the request ID.
+
+        Raises BatchTimeoutError if the request ID doesn't arrive in time.
+        """
+        if self.CREATE not in self.batched:
+            return self.dao.createRequest(*args)
+        call = self._queue(self.CREATE, args)
+        if not call.done.wait(self.timeout):
+            with self._condition:
+                if call in self._pending:
+                    # Not sent yet, drop it.
+                    self._pending.remove(call)
+            raise BatchTimeoutError("Batched createRequest timed out after %s seconds." % self.timeout)
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def closeRequest(self, *args):
+        """Queue closeRequest call."""
+        if self.CLOSE not in self.batched:
+            return self.dao.closeRequest(*args)
+        self._queue(self.CLOSE, args)
+
+    def closeSession(self, *args):
+        """Send queued calls and close the session."""
+        if self.CLOSE in self.batched:
+            self.flush(self.timeout)
+        return self.dao.closeSession(*args)
+
+    def flush(self, timeout=None):
+        """Send all pending calls and wait until they are sent.
+
+        Returns True if all calls were sent, False on timeout.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._condition:
+            self._flush_requested = True
+            self._condition.notify_all()
+            while self._pending or self._in_flight:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            return not (self._pending or self._in_flight)
+
+    def close(self, timeout=None):
+        """Send all pending calls and stop the flushing thread."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if self._flusher is not None:
+            self._flusher.join(timeout)
+
+    def _queue(self, method, args):
+        call = _PendingCall(method, args)
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("BatchingDao has been closed.")
+            self._pending.append(call)
+            # The first call starts the delay of the batch.
+            if len(self._pending) == 1 or len(self._pending) >= self.max_size:
+                self._condition.notify_all()
+        return call
+
+    def _next_batch(self):
+        """Wait for the next batch to be ready and return it. Return None when closed."""
+        with self._condition:
+            while True:
+                if self._pending:
+                    age = time.time() - self._pending[0].created
+                    if (len(self._pending) >= self.max_size or age >= self.max_delay or self._closed
+                            or self._flush_requested):
+                        break
+                    self._condition.wait(self.max_delay - age)
+                elif self._closed:
+                    return None
+                else:
+                    self._flush_requested = False
+                    self._condition.wait()
+            batch = [self._pending.popleft() for _ in range(min(self.max_size, len(self._pending)))]
+            if not self._pending:
+                self._flush_requested = False
+            self._in_flight = len(batch)
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                # Send creates first, so no close overtakes the create of its request.
+                self._send([c for c in batch if c.method == self.CREATE], self.CREATE)
+                self._send([c for c in batch if c.method == self.CLOSE], self.CLOSE)
+            finally:
+                with self._condition:
+                    self._in_flight = 0
+                    self._condition.notify_all()
+
+    def _send(self, calls, method):
+        """Send the calls using the bulk method."""
+        if not calls:
+            return
+        try:
+            results = getattr(self.dao, self.BULK_METHODS[method])([c.args for c in calls])
+        except Exception as error:
+            self._fail(calls, error)
+        else:
+            results = list(results) if results is not None else [None] * len(calls)
+            for call, result in zip(calls, results):
+                call.resolve(result)
+            if len(results) < len(calls):
+                self._fail(calls[len(results):], RuntimeError(
+                    "Bulk %s returned %d results for %d calls." % (method, len(results), len(calls))))
+
+    def _fail(self, calls, error):
+        for call in calls:
+            if call.method == self.CLOSE:
+                LOGGER.error('Logger failed to error during batched %s: %s.', call.method, error)
+            call.resolve(error=error)
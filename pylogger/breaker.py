@@ -0,0 +1,165 @@
+#
+# Copyright (C) 2022  CZ.NIC, z. s. p. o.
+#
+# This file is part of FRED.
+#
+# FRED is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# FRED is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with FRED.  If not, see <https://www.gnu.org/licenses/>.
+"""Circuit breaker of calls to the logger server."""
+from __future__ import unicode_literals
+
+import threading
+from collections import deque
+from timeit import default_timer
+
+__all__ = ["CircuitBreaker", "CircuitOpenError"]
+
+# States of the circuit breaker.
+# Calls pass, their failures are counted.
+CLOSED = 'closed'
+# Calls are rejected.
+OPEN = 'open'
+# Only a limited number of probe calls pass.
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """Call was rejected by an open circuit breaker."""
+
+
+class CircuitBreaker(object):
+    """Circuit breaker, which rejects calls while the server is failing.
+
+    The breaker opens, when the rate of failed calls among the last `window_size` calls reaches `error_rate`.
+    Calls slower than `latency_threshold` count as failed. After `reset_timeout` seconds, the breaker lets
+    `half_open_probes` calls through. If all of them succeed, the breaker closes, otherwise it opens again.
+
+    Example:
+        breaker = CircuitBreaker(error_rate=0.5, latency_threshold=1.0, reset_timeout=30)
+        logger = LoggerFailSilent(dao, circuit_breaker=breaker)
+
+    Attributes:
+        state: Current state - CLOSED, OPEN or HALF_OPEN.
+        transitions: Dictionary state -> number of transitions to the state.
+        rejected: Number of rejected calls.
+    """
+
+    def __init__(self, error_rate=0.5, latency_threshold=None, window_size=20, min_calls=10, reset_timeout=30,
+                 half_open_probes=1):
+        """Init CircuitBreaker.
+
+        Arguments:
+            error_rate: Rate of failed calls, which opens the breaker.
+            latency_threshold: Number of seconds, after which a call counts as failed. Not used if None.
+            window_size: Number of the last calls, from which the error rate is computed.
+            min_calls: Minimal number of calls in the window to open the breaker.
+            reset_timeout: Number of seconds the breaker stays open before probe calls are let through.
+            half_open_probes: Number of successful probe calls, which close the breaker.
+        """
+        self.error_rate = error_rate
+        self.latency_threshold = latency_threshold
+        self.min_calls = min_calls
+        self.reset_timeout = reset_timeout
+        self.half_open_probes = half_open_probes
+        self.state = CLOSED
+        self.transitions = {CLOSED: 0, OPEN: 0, HALF_OPEN: 0}
+        self.rejected = 0
+        # Whether each of the last calls failed.
+        self._window = deque(maxlen=window_size)
+        self._opened = None
+        self._probes = 0
+        self._successes = 0
+        self._lock = threading.Lock()
+
+    def rejects(self):
+        """Return whether a call is rejected right away, without using a probe call.
+
+        Rejected calls are counted.
+        """
+        if self.state == OPEN and default_timer() - self._opened < self.reset_timeout:
+            with self._lock:
+                self.rejected += 1
+            return True
+        return False
+
+    def allow(self):
+        """Return whether a call may pass. Each allowed call must be recorded."""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                if default_timer() - self._opened < self.reset_timeout:
+                    self.rejected += 1
+                    return False
+                self._transition(HALF_OPEN)
+            if self._probes >= self.half_open_probes:
+                self.rejected += 1
+                return False
+            self._probes += 1
+            return True
+
+    def record(self, success, duration=None):
+        """Record result of an allowed call."""
+        failed = not success or (self.latency_threshold is not None and duration is not None
+                                 and duration > self.latency_threshold)
+        with self._lock:
+            if self.state == HALF_OPEN:
+                if failed:
+                    self._transition(OPEN)
+                else:
+                    self._successes += 1
+                    if self._successes >= self.half_open_probes:
+                        self._transition(CLOSED)
+            elif self.state == CLOSED:
+                self._window.append(failed)
+                if (len(self._window) >= self.min_calls
+                        and sum(self._window) >= self.error_rate * len(self._window)):
+                    self._transition(OPEN)
+            # Calls finished after the breaker opened are ignored.
+
+    def call(self, function, *args, **kwargs):
+        """Call the function, if the breaker allows it, and record its result.
+
+        Raises CircuitOpenError if the call is rejected.
+        """
+        if not self.allow():
+            raise CircuitOpenError("Circuit breaker is open.")
+        start = default_timer()
+        try:
+            result = function(*args, **kwargs)
+        except Exception:
+            self.record(False, default_timer() - start)
+            raise
+        self.record(True, default_timer() - start)
+        return result
+
+    def stats(self):
+        """Return dictionary with the state and counters of the breaker."""
+        with self._lock:
+            stats = {'state': self.state, 'rejected': self.rejected}
+            for state, count in self.transitions.items():
+                stats['to_%s' % state] = count
+            return stats
+
+    def _after_fork(self):
+        # The lock may have been held by another thread of the parent.
+        self._lock = threading.Lock()
+
+    def _transition(self, state):
+        self.state = state
+        self.transitions[state] += 1
+        self._probes = 0
+        self._successes = 0
+        self._window.clear()
+        if state == OPEN:
+            self._opened = default_timer()
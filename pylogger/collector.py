@@ -0,0 +1,355 @@
+#
+# Copyright (C) 2022  CZ.NIC, z. s. p. o.
+#
+# This file is part of FRED.
+#
+# FRED is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# FRED is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with FRED.  If not, see <https://www.gnu.org/licenses/>.
+"""Local collector of logger calls from many processes.
+
+Collector owns the DAO of the logger server and receives the calls of worker processes over a Unix domain socket.
+Creates and closes of requests are sent to the server in batches, if it provides bulk methods, and type codes are
+loaded from the server only once for all workers.
+
+Run the collector:
+    python -m pylogger.collector --socket /run/fred/pylogger.sock --nameservice localhost:2809
+
+and use the CollectorDao in the workers:
+    logger = Logger(CollectorDao('/run/fred/pylogger.sock'))
+
+Each frame consists of a header with the payload size, frame type and call ID followed by a JSON payload.
+"""
+from __future__ import unicode_literals
+
+import argparse
+import json
+import logging
+import os
+import signal
+import socket
+import struct
+import sys
+import threading
+import time
+
+from six.moves import socketserver
+
+from .batching import BatchingDao
+from .conversion import decode_properties, decode_references, encode_properties, encode_references
+
+__all__ = ["Collector", "CollectorDao", "CollectorError"]
+
+LOGGER = logging.getLogger(__name__)
+
+# Payload size, frame type and call ID.
+FRAME_HEADER = struct.Struct('!IBI')
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+
+# Frame types.
+# Call, which expects a result.
+CALL = 1
+# Call without a result.
+SEND = 2
+RESULT = 3
+ERROR = 4
+
+# Indexes of properties and references in arguments of the methods.
+CONVERTED_ARGS = {'createRequest': (3, 4), 'closeRequest': (2, 3)}
+# Methods, which return type codes.
+CODE_METHODS = ('getServices', 'getRequestTypesByService', 'getResultCodesByService')
+METHODS = CODE_METHODS + ('createSession', 'closeSession', 'createRequest', 'closeRequest')
+
+
+class CollectorError(Exception):
+    """Call failed in the collector."""
+
+
+class _Record(object):
+    """Structure returned by the collector, e.g. service type or request type."""
+
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+def _encode_args(method, args):
+    args = list(args)
+    if method in CONVERTED_ARGS:
+        properties_index, references_index = CONVERTED_ARGS[method]
+        args[properties_index] = encode_properties(args[properties_index])
+        args[references_index] = encode_references(args[references_index])
+    return args
+
+
+def _decode_args(method, args):
+    if method in CONVERTED_ARGS:
+        properties_index, references_index = CONVERTED_ARGS[method]
+        args[properties_index] = decode_properties(args[properties_index])
+        args[references_index] = decode_references(args[references_index])
+    return args
+
+
+def _encode_records(records):
+    return [{key: value for key, value in vars(record).items() if not key.startswith('_')} for record in records]
+
+
+def _write_frame(write, frame_type, call_id, payload):
+    data = json.dumps(payload).encode('utf-8')
+    write(FRAME_HEADER.pack(len(data), frame_type, call_id) + data)
+
+
+def _read_frame(rfile):
+    """Read a frame from the file and return (frame type, call ID, payload) or None at the end of file."""
+    header = rfile.read(FRAME_HEADER.size)
+    if not header:
+        return None
+    if len(header) < FRAME_HEADER.size:
+        raise EOFError("Connection closed inside of a frame header.")
+    size, frame_type, call_id = FRAME_HEADER.unpack(header)
+    if size > MAX_FRAME_SIZE:
+        raise ValueError("Frame of %d bytes exceeds the maximal size." % size)
+    data = rfile.read(size)
+    if len(data) < size:
+        raise EOFError("Connection closed inside of a frame.")
+    return frame_type, call_id, json.loads(data.decode('utf-8'))
+
+
+class CollectorDao(object):
+    """Data Access Object, which sends the calls to a local collector.
+
+    Each thread uses its own connection, connections are reopened after a fork.
+    Closes of requests and sessions don't wait for the result, their errors are logged by the collector.
+    """
+
+    def __init__(self, path, timeout=None):
+        """Init CollectorDao.
+
+        Arguments:
+            path: Path to the Unix domain socket of the collector.
+            timeout: Timeout of socket operations in seconds.
+        """
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def getServices(self):
+        return [_Record(**record) for record in self._call('getServices', ())]
+
+    def getRequestTypesByService(self, service_id):
+        return [_Record(**record) for record in self._call('getRequestTypesByService', (service_id, ))]
+
+    def getResultCodesByService(self, service_id):
+        return [_Record(**record) for record in self._call('getResultCodesByService', (service_id, ))]
+
+    def createSession(self, user_id, username):
+        return self._call('createSession', (user_id, username))
+
+    def closeSession(self, session_id):
+        self._call('closeSession', (session_id, ), reply=False)
+
+    def createRequest(self, *args):
+        return self._call('createRequest', args)
+
+    def closeRequest(self, *args):
+        self._call('closeRequest', args, reply=False)
+
+    def close(self):
+        """Close the connection of the current thread."""
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            self._local.connection = None
+            connection[1].close()
+            connection[2].close()
+
+    def _connect(self):
+        """Return connection of the current thread - (pid, socket, file), open it if necessary."""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or connection[0] != os.getpid():
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.path)
+            connection = (os.getpid(), sock, sock.makefile('rb'))
+            self._local.connection = connection
+            self._local.call_id = 0
+        return connection
+
+    def _call(self, method, args, reply=True):
+        _, sock, rfile = self._connect()
+        self._local.call_id = (self._local.call_id + 1) % 2 ** 32
+        call_id = self._local.call_id
+        try:
+            _write_frame(sock.sendall, CALL if reply else SEND, call_id, [method, _encode_args(method, args)])
+            if not reply:
+                return None
+            frame = _read_frame(rfile)
+        except Exception:
+            # Connection is in unknown state.
+            self.close()
+            raise
+        if frame is None or frame[1] != call_id:
+            self.close()
+            raise CollectorError("Unexpected response of the collector to %s." % method)
+        frame_type, _, payload = frame
+        if frame_type == ERROR:
+            raise CollectorError(payload)
+        return payload
+
+
+class _CollectorHandler(socketserver.StreamRequestHandler):
+    """Handler of a connection of a worker."""
+
+    def handle(self):
+        while True:
+            try:
+                frame = _read_frame(self.rfile)
+            except (EOFError, ValueError, socket.error) as error:
+                LOGGER.warning('Collector dropped connection: %s', error)
+                return
+            if frame is None:
+                return
+            frame_type, call_id, (method, args) = frame
+            try:
+                result = self.server.collector.call(method, args)
+            except Exception as error:
+                if frame_type == CALL:
+                    _write_frame(self.wfile.write, ERROR, call_id, '%s: %s' % (type(error).__name__, error))
+                else:
+                    LOGGER.error('Logger failed to error during collected %s: %s.', method, error)
+            else:
+                if frame_type == CALL:
+                    _write_frame(self.wfile.write, RESULT, call_id, result)
+
+
+class _CollectorServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class Collector(object):
+    """Collector of logger calls from worker processes.
+
+    Type codes are cached for `codes_ttl` seconds. Creates and closes of requests are batched by BatchingDao,
+    if the DAO provides bulk methods, otherwise they are sent right away from the thread of the worker connection.
+
+    Example:
+        collector = Collector(dao, '/run/fred/pylogger.sock')
+        collector.serve_forever()
+    """
+
+    def __init__(self, dao, path, max_size=100, max_delay=0.05, codes_ttl=3600, mode=None):
+        """Init Collector.
+
+        Arguments:
+            dao: Data Access Object of the logger server.
+            path: Path to the Unix domain socket.
+            max_size: Maximal number of calls in a batch.
+            max_delay: Maximal number of seconds a call waits for the batch to be sent.
+            codes_ttl: Number of seconds the type codes are cached.
+            mode: Permissions of the socket.
+        """
+        self.dao = BatchingDao(dao, max_size=max_size, max_delay=max_delay)
+        self.path = path
+        self.codes_ttl = codes_ttl
+        self.mode = mode
+        self._codes = {}
+        self._codes_lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    def call(self, method, args):
+        """Call the method of the DAO with encoded arguments and return the encoded result."""
+        if method not in METHODS:
+            raise ValueError("Unknown method %s." % method)
+        if method in CODE_METHODS:
+            return self._get_codes(method, args)
+        return getattr(self.dao, method)(*_decode_args(method, args))
+
+    def bind(self):
+        """Bind the socket."""
+        if os.path.exists(self.path):
+            # Socket left by a previous collector.
+            os.unlink(self.path)
+        self._server = _CollectorServer(self.path, _CollectorHandler)
+        self._server.collector = self
+        if self.mode is not None:
+            os.chmod(self.path, self.mode)
+
+    def serve_forever(self):
+        """Bind the socket, unless it's bound already, and serve the workers until shutdown."""
+        if self._server is None:
+            self.bind()
+        self._server.serve_forever()
+
+    def start(self):
+        """Serve the workers in a background thread."""
+        self.bind()
+        self._thread = threading.Thread(target=self._server.serve_forever, name='pylogger-collector')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def shutdown(self, timeout=None):
+        """Stop serving the workers and send all pending calls to the server."""
+        if self._server is not None:
+            if self._thread is not None:
+                self._server.shutdown()
+                self._thread.join(timeout)
+            self._server.server_close()
+            self._server = None
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+        self.dao.close(timeout)
+
+    def _get_codes(self, method, args):
+        key = (method, ) + tuple(args)
+        with self._codes_lock:
+            cached = self._codes.get(key)
+            if cached is None or time.time() - cached[0] > self.codes_ttl:
+                cached = (time.time(), _encode_records(getattr(self.dao, method)(*args)))
+                self._codes[key] = cached
+            return cached[1]
+
+
+def _resolve_dao(nameservice, context, object_name):
+    """Return the logger object from the CORBA naming service."""
+    import CosNaming
+    from fred_idl import ccReg
+    from omniORB import CORBA
+
+    orb = CORBA.ORB_init(['-ORBInitRef', 'NameService=corbaname::%s' % nameservice], CORBA.ORB_ID)
+    naming = orb.resolve_initial_references('NameService')._narrow(CosNaming.NamingContext)
+    name = [CosNaming.NameComponent(context, 'context'), CosNaming.NameComponent(object_name, 'Object')]
+    return naming.resolve(name)._narrow(ccReg.Logger)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Collector of logger calls from worker processes.')
+    parser.add_argument('--socket', required=True, help='path to the Unix domain socket')
+    parser.add_argument('--nameservice', default='localhost:2809', help='host and port of the CORBA naming service')
+    parser.add_argument('--context', default='fred', help='CORBA naming context')
+    parser.add_argument('--object', default='Logger', help='name of the logger object')
+    parser.add_argument('--max-size', type=int, default=100, help='maximal number of calls in a batch')
+    parser.add_argument('--max-delay', type=float, default=0.05, help='maximal delay of a call in seconds')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    collector = Collector(_resolve_dao(args.nameservice, args.context, args.object), args.socket,
+                          max_size=args.max_size, max_delay=args.max_delay)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        collector.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        collector.shutdown()
+
+
+if __name__ == '__main__':
+    main()
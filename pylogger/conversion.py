@@ -0,0 +1,165 @@
+#
+# Copyright (C) 2022  CZ.NIC, z. s. p. o.
+#
+# This file is part of FRED.
+#
+# FRED is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# FRED is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with FRED.  If not, see <https://www.gnu.org/licenses/>.
+"""Conversion of request properties to RequestProperty structures and of the structures to JSON."""
+from __future__ import unicode_literals
+
+import datetime
+
+import six
+from fred_idl import ccReg
+from pyfco import u2c
+
+__all__ = ["PropertyConverter", "decode_properties", "decode_references", "encode_properties", "encode_references"]
+
+
+def _keep_string(value):
+    return value
+
+
+def _convert_date(value):
+    return six.text_type(value.isoformat())
+
+
+def _convert_sequence(value):
+    """Convert nested lists (or tuples) of objects to string of nested lists of strings."""
+    result = []
+    stack = [(value, result)]
+    while stack:
+        sequence, target = stack.pop()
+        for item in sequence:
+            if isinstance(item, (list, tuple)):
+                # Append the nested list first to keep the order, fill it later.
+                nested = []
+                target.append(nested)
+                stack.append((item, nested))
+            elif isinstance(item, datetime.date):
+                target.append(item.isoformat())
+            else:
+                target.append(six.text_type(item))
+    return six.text_type(result)
+
+
+def _convert_other(value):
+    return six.text_type(value)
+
+
+def _get_value_converter(value_type):
+    """Return function converting value of the type to string."""
+    if issubclass(value_type, six.string_types):
+        return _keep_string
+    if issubclass(value_type, datetime.date):
+        return _convert_date
+    if issubclass(value_type, (list, tuple)):
+        return _convert_sequence
+    return _convert_other
+
+
+class PropertyConverter(object):
+    """Converter of python lists of [name, value, child] to RequestProperties.
+
+    Values are converted by functions looked up by the type of the value. Encoded property names are cached,
+    since the same names are repeated in every request of the same type.
+
+    Values are converted to strings as follows:
+        * strings are kept,
+        * dates and datetimes are converted to ISO format,
+        * nested lists and tuples are converted to a string representation of lists of strings,
+        * other values are converted to strings.
+    """
+
+    def __init__(self, max_cached_names=10000):
+        """Init PropertyConverter.
+
+        Arguments:
+            max_cached_names: Maximal number of cached property names. Cache is cleared when exceeded.
+        """
+        self.max_cached_names = max_cached_names
+        self._names = {}
+        self._value_converters = {}
+
+    def convert_name(self, name):
+        """Convert property name to CORBA string."""
+        if type(name) is not six.text_type:
+            # Only cache text names, other types may be equal, but differ in string representation.
+            if not isinstance(name, six.string_types):
+                name = six.text_type(name)
+            return u2c(name)
+        encoded = self._names.get(name)
+        if encoded is None:
+            if len(self._names) >= self.max_cached_names:
+                self._names.clear()
+            encoded = self._names[name] = u2c(name)
+        return encoded
+
+    def convert_value(self, value):
+        """Convert property value to CORBA string."""
+        value_type = type(value)
+        converter = self._value_converters.get(value_type)
+        if converter is None:
+            converter = self._value_converters[value_type] = _get_value_converter(value_type)
+        return u2c(converter(value))
+
+    def convert_property(self, name, value, child=False):
+        """Convert property to RequestProperty."""
+        return ccReg.RequestProperty(self.convert_name(name), self.convert_value(value), child)
+
+    def iter_properties(self, properties):
+        """Yield RequestProperty for each [name, value, child] in the properties."""
+        names = self._names
+        value_converters = self._value_converters
+        text_type = six.text_type
+        request_property = ccReg.RequestProperty
+        for prop in properties:
+            name = prop[0]
+            # Inlined convert_name and convert_value for the common case of text names and values.
+            encoded_name = names.get(name) if type(name) is text_type else None
+            if encoded_name is None:
+                encoded_name = self.convert_name(name)
+            value = prop[1]
+            if type(value) is text_type:
+                value = u2c(value)
+            else:
+                converter = value_converters.get(type(value))
+                value = u2c(converter(value)) if converter is not None else self.convert_value(value)
+            yield request_property(encoded_name, value, prop[2] if len(prop) > 2 else False)
+
+    def convert_properties(self, properties):
+        """Convert properties to list of RequestProperties."""
+        if not properties:
+            return []
+        return list(self.iter_properties(properties))
+
+
+def encode_properties(converted_properties):
+    """Encode RequestProperties to JSON serializable lists [name, value, child]."""
+    return [[prop.name, prop.value, prop.child] for prop in converted_properties]
+
+
+def decode_properties(properties):
+    """Decode RequestProperties from lists [name, value, child]."""
+    return [ccReg.RequestProperty(u2c(name), u2c(value), child) for name, value, child in properties]
+
+
+def encode_references(converted_references):
+    """Encode ObjectReferences to JSON serializable lists [type, id]."""
+    return [[ref.type, ref.id] for ref in converted_references]
+
+
+def decode_references(references):
+    """Decode ObjectReferences from lists [type, id]."""
+    return [ccReg.ObjectReference(object_type, object_id) for object_type, object_id in references]
@@ -20,20 +20,23 @@
 """Logging framework."""
 from __future__ import unicode_literals
 
-import datetime
+import functools
 import logging
+import threading
+import time
 import traceback
 
 import omniORB
-import six
 from fred_idl import ccReg
 from pyfco import u2c
 
-from . import dummylogger
+from . import breaker, conversion, dummylogger, sampling, tracing, typecodes
 
-__all__ = ["Logger", "LogRequest",
+__all__ = ["Logger", "LogRequest", "RequestTemplate",
            "LoggingException", "service_type_webadmin"]
 
+LOGGER = logging.getLogger(__name__)
+
 # Constant representing web admin service type (hardcoded in db).
 service_type_webadmin = 4
 
@@ -90,7 +93,17 @@ class Logger(object):
 
     """
 
-    def __init__(self, dao):
+    # Number of added properties and references of a request, after which they are sent to the server.
+    # Only applies if the DAO supports addRequestProperties, otherwise they are all kept in memory until close.
+    property_chunk_size = 1000
+    # CircuitBreaker of the calls to the server.
+    circuit_breaker = None
+    # Minimal age of type codes in seconds, which are reloaded when an unknown code is requested.
+    # If None, codes are not reloaded on unknown codes.
+    type_codes_min_reload_interval = 60
+
+    def __init__(self, dao, type_codes_cache=None, lazy_type_codes=False, metrics=None, policies=None,
+                 type_codes_refresh_interval=None, session_cache=None, tracer=None):
         """Init Logger.
 
         Arguments:
@@ -98,13 +111,38 @@ class Logger(object):
                 That's where we get our data from / send them to.
                 Generally it's a Corba Logger object for normal use and
                 mock object for unit tests.
-            corba_module: Corba module to be used. This argument is deprecated.
+            type_codes_cache: TypeCodesCache to load the type codes from. Stale codes are refreshed in background.
+            lazy_type_codes: If True, codes of a service are loaded on its first use,
+                unless they're loaded from the cache.
+            metrics: DaoMetrics to record the DAO calls of sessions and requests.
+            policies: Dictionary (service name, request type name) -> SamplingPolicy.
+                Request type name None applies the policy to all request types of the service.
+            type_codes_refresh_interval: Number of seconds between reloads of type codes in background.
+                If None, codes are reloaded only on demand or when an unknown code is requested.
+            session_cache: SessionCache of sessions acquired by acquire_session.
+            tracer: Tracer of the phases of sessions and requests.
         """
         self.dao = dao
-        self.request_type_codes = {}
-        self.result_codes = {}
+        self.metrics = metrics
+        self.tracer = tracing.NULL_TRACER if tracer is None else tracer
+        self.policies = dict(policies or {})
+        self.type_codes_cache = type_codes_cache
+        self.lazy_type_codes = lazy_type_codes
+        self.type_codes = typecodes.TypeCodeRegistry({}, {})
+        self.type_codes_refresher = None
+        if type_codes_refresh_interval is not None:
+            self.type_codes_refresher = typecodes.TypeCodeRefresher(self.reload_type_codes,
+                                                                    type_codes_refresh_interval)
         self.object_types = {}
+        self.property_converter = conversion.PropertyConverter()
+        self._services_lock = threading.Lock()
+        self._reload_lock = threading.Lock()
         self._load_all_type_codes()
+        if self.type_codes_refresher is not None:
+            self.type_codes_refresher.start()
+        self.session_cache = session_cache
+        if session_cache is not None:
+            session_cache.start(self.close_session)
 
         # Default result code for each service (aka unexpected error) - for each service, there will
         # be some default result code, which will be set in constructor of request, so when
@@ -132,26 +170,57 @@ class Logger(object):
             user_id: Int. Registrar id for EPP session or user id for other apps.
             username: String. Registrar Handle for EPP session or username for other apps.
         """
+        trace = self._start_trace('start_session')
         username = u2c(username)
 
-        logging.debug("<Logger %s> createSession %s %s" % (id(self), user_id, username))
-        session_id = self.dao.createSession(user_id, username)
+        LOGGER.debug("<Logger %s> createSession %s %s", id(self), user_id, username)
+        session_id = self._call_dao(self.dao.createSession, 'createSession', '', '', user_id, username)
+        if trace is not None:
+            self._finish_trace(trace, tracing.DAO_CALL)
         if session_id == 0:
             raise LoggingException(
                 """Logging session failed to start with args: (%s).""" % username)
         return session_id
 
+    def acquire_session(self, user_id, username):
+        """Return ID of an open session of the user, start a new one if necessary.
+
+        Sessions are shared by the session cache, if there is one. Each acquired session must be released
+        by release_session.
+        """
+        if self.session_cache is None:
+            return self.start_session(user_id, username)
+        return self.session_cache.acquire(user_id, username, functools.partial(self.start_session, user_id, username))
+
+    def release_session(self, session_id):
+        """Release the session acquired by acquire_session.
+
+        Cached session is closed when it expires, other sessions are closed right away.
+        """
+        if not session_id:
+            # Session failed to start.
+            return
+        if self.session_cache is None or not self.session_cache.release(session_id):
+            self.close_session(session_id)
+
     def create_request(self, source_ip, service_name, request_type_name,
                        properties=None, references=None, session_id=None,
-                       default_result=None, content=''):
+                       default_result=None, content='', deferred=False):
         """Create a request object on the server.
 
+        If deferred, the request is created on the server only when it's closed or its request_id is read.
         Returns a new LogRequest object or None on error.
         """
-        if default_result is None:
-            default_result = self.default_results.get(service_name)
-            if default_result is None:
-                raise LoggingException('Service "%s" doesn\'t have specified default result code!' % service_name)
+        default_result = self._get_default_result(service_name, default_result)
+        create_args = (source_ip, content, service_name, request_type_name, properties, references, session_id)
+        if self.policies:
+            sampled_request = self._sample_request(service_name, request_type_name, default_result, create_args)
+            if sampled_request is not None:
+                return sampled_request
+        if deferred:
+            # Fail on unknown codes right away, not on close.
+            self._get_request_type_code(service_name, request_type_name)
+            return DeferredLogRequest(self, create_args, service_name, request_type_name, default_result)
         request_id = self._server_create_request(
             source_ip, content, service_name, request_type_name, properties, references, session_id)
         log_request = LogRequest(self, request_id, service_name, request_type_name, default_result)
@@ -160,6 +229,55 @@ class Logger(object):
     def create_dummy_request(self, *args, **kwargs):
         return dummylogger.DummyLogRequest(*args, **kwargs)
 
+    def template(self, service_name, request_type_name, static_properties=None, static_references=None,
+                 default_result=None):
+        """Return a factory of requests of the service and request type.
+
+        Codes and default result are resolved and static properties and references are converted only once.
+
+        Example:
+            domain_create = logger.template("EPP", "DomainCreate", static_properties=[['server', 'epp1']])
+            ...
+            req = domain_create("127.0.0.1", props, session_id=session_id)
+            req.close(result='Success')
+        """
+        return RequestTemplate(self, service_name, request_type_name, static_properties, static_references,
+                               default_result)
+
+    def set_policy(self, service_name, request_type_name, policy):
+        """Set sampling policy of the request type, or of all request types of the service, if it's None."""
+        self.policies[(service_name, request_type_name)] = policy
+
+    def _sample_request(self, service_name, request_type_name, default_result, create_args, fail_silent=False):
+        """Apply the sampling policy to the request.
+
+        Returns a request, which is not created on the server yet, or None if the request should be created.
+        """
+        policy = self.policies.get((service_name, request_type_name)) or self.policies.get((service_name, None))
+        if policy is None:
+            return None
+        decision = policy.decide()
+        if decision == sampling.DROP:
+            return dummylogger.DummyLogRequest()
+        if decision == sampling.DEFER:
+            return self._conditional_request(policy, create_args, service_name, request_type_name, default_result,
+                                             fail_silent)
+        return None
+
+    def _conditional_request(self, policy, create_args, service_name, request_type_name, default_result,
+                             fail_silent):
+        """Return a request, which is created on close, if the sampling policy decides so."""
+        return ConditionalLogRequest(self, policy, create_args, service_name, request_type_name, default_result,
+                                     fail_silent=fail_silent)
+
+    def _get_default_result(self, service_name, default_result=None):
+        """Return default result for the service, unless one is provided."""
+        if default_result is None:
+            default_result = self.default_results.get(service_name)
+            if default_result is None:
+                raise LoggingException('Service "%s" doesn\'t have specified default result code!' % service_name)
+        return default_result
+
     def close_session(self, session_id):
         """Tell the server to close this logging session.
 
@@ -167,87 +285,246 @@ class Logger(object):
         """
         if session_id is None:
             raise LoggingException("Error in close_session: session_id cannot be None.")
-        logging.debug("<Logger %s> closeSession %s" % (id(self), session_id))
-        self.dao.closeSession(session_id)
+        trace = self._start_trace('close_session')
+        LOGGER.debug("<Logger %s> closeSession %s", id(self), session_id)
+        self._call_dao(self.dao.closeSession, 'closeSession', '', '', session_id)
+        if trace is not None:
+            self._finish_trace(trace, tracing.DAO_CALL)
+
+    def _start_trace(self, operation, service_name='', request_type_name=''):
+        """Return a new trace of the operation or None, if tracing is disabled."""
+        if not self.tracer.enabled:
+            return None
+        return tracing.Trace(operation, {'service': service_name, 'request_type': request_type_name})
+
+    def _finish_trace(self, trace, phase):
+        """End the last phase of the trace and record it."""
+        trace.phase(phase)
+        trace.finish()
+        try:
+            self.tracer.record(trace)
+        except Exception as e:
+            LOGGER.error('Logger failed to error during trace record: %s.', e)
+
+    @property
+    def request_type_codes(self):
+        """Return request type codes of the current registry."""
+        return self.type_codes.request_type_codes
+
+    @request_type_codes.setter
+    def request_type_codes(self, request_type_codes):
+        self._replace_type_codes(request_type_codes=request_type_codes)
+
+    @property
+    def result_codes(self):
+        """Return result codes of the current registry."""
+        return self.type_codes.result_codes
+
+    @result_codes.setter
+    def result_codes(self, result_codes):
+        self._replace_type_codes(result_codes=result_codes)
+
+    def _replace_type_codes(self, request_type_codes=None, result_codes=None):
+        """Replace the registry by a new one with the provided codes and the other codes of the current one."""
+        registry = getattr(self, 'type_codes', None)
+        if registry is None:
+            registry = typecodes.TypeCodeRegistry({}, {}, generation=-1)
+        if request_type_codes is None:
+            request_type_codes = registry.request_type_codes
+        if result_codes is None:
+            result_codes = registry.result_codes
+        self.type_codes = typecodes.TypeCodeRegistry(request_type_codes, result_codes, registry.generation + 1)
 
     def _load_all_type_codes(self):
-        """Load all service types and request types to attributes request_type_codes and service_codes."""
-        logging.debug("<Logger %s> getServices" % id(self))
-        service_type_list = self.dao.getServices()
-        for service_type in service_type_list:
-            self._load_request_type_codes(service_type)
-            self._load_result_codes(service_type)
+        """Load the type codes registry, from the cache if possible."""
+        if self.type_codes_cache is not None:
+            cached = self.type_codes_cache.load()
+            if cached is not None:
+                self.type_codes = typecodes.TypeCodeRegistry(cached.request_type_codes, cached.result_codes)
+                if cached.stale:
+                    self._get_type_codes_refresher().trigger()
+                self._load_object_types()
+                return
+
+        self.type_codes = self._create_type_codes(self.lazy_type_codes, 0)
         self._load_object_types()
 
-    def _load_request_type_codes(self, service_type):
+    def reload_type_codes(self):
+        """Reload all type codes from the server and replace the registry.
+
+        Returns the new registry.
+        """
+        return self._reload_type_codes(self.type_codes.generation)
+
+    def _reload_type_codes(self, generation):
+        """Reload type codes, unless the registry of the generation was replaced already.
+
+        Concurrent reloads of the same registry are coalesced into a single one.
+        """
+        with self._reload_lock:
+            if self.type_codes.generation == generation:
+                # Codes from the cache are refreshed completely.
+                lazy = self.lazy_type_codes and self.type_codes_cache is None
+                self.type_codes = self._create_type_codes(lazy, generation + 1)
+        return self.type_codes
+
+    def _after_fork(self):
+        """Reset the state, which can't be used by the child process after fork."""
+        # Locks may have been held by other threads of the parent.
+        self._services_lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        for component in [self.metrics, self.circuit_breaker] + list(self.policies.values()):
+            if component is not None:
+                component._after_fork()
+        # Threads of the parent don't run in the child.
+        if self.type_codes_refresher is not None:
+            self.type_codes_refresher.start()
+
+    def _get_type_codes_refresher(self):
+        """Return running type codes refresher, start it if necessary."""
+        if self.type_codes_refresher is None:
+            self.type_codes_refresher = typecodes.TypeCodeRefresher(self.reload_type_codes)
+        self.type_codes_refresher.start()
+        return self.type_codes_refresher
+
+    def _create_type_codes(self, lazy, generation):
+        """Load type codes from the server and return a new registry."""
+        LOGGER.debug("<Logger %s> getServices", id(self))
+        service_type_list = self._call_dao(self.dao.getServices, 'getServices', '', '')
+        if lazy:
+            services = {}
+            for service_type in service_type_list:
+                services[service_type.name] = service_type
+                if service_type.name in typecodes.OLD_SERVICE_NAMES:
+                    services[typecodes.OLD_SERVICE_NAMES[service_type.name]] = service_type
+            request_type_codes = typecodes.LazyServiceCodes(None)
+            result_codes = typecodes.LazyServiceCodes(None)
+            request_type_codes.loader = result_codes.loader = functools.partial(
+                self._load_service_codes, services, request_type_codes, result_codes)
+        else:
+            request_type_codes = {}
+            result_codes = {}
+            for service_type in service_type_list:
+                self._load_request_type_codes(service_type, request_type_codes)
+                self._load_result_codes(service_type, result_codes)
+            if self.type_codes_cache is not None:
+                try:
+                    self.type_codes_cache.store(request_type_codes, result_codes)
+                except Exception as e:
+                    # The cache is optional, loaded codes are used anyway.
+                    LOGGER.error('Logger failed to error during type codes cache store: %s.', e)
+        return typecodes.TypeCodeRegistry(request_type_codes, result_codes, generation)
+
+    def _load_service_codes(self, services, request_type_codes, result_codes, service_name):
+        """Load request type codes and result codes of the service, unless they're loaded already."""
+        with self._services_lock:
+            service_type = services.get(service_name)
+            if service_type is None:
+                return
+            self._load_request_type_codes(service_type, request_type_codes)
+            self._load_result_codes(service_type, result_codes)
+            # Drop all names of the service only once it's loaded, so a failed load is tried again.
+            for name, other in list(services.items()):
+                if other is service_type:
+                    del services[name]
+
+    def _reload_on_miss(self):
+        """Reload type codes after an unknown code was requested, unless they're too fresh.
+
+        Returns whether the codes were reloaded.
+        """
+        registry = self.type_codes
+        if (self.type_codes_min_reload_interval is None
+                or time.time() - registry.loaded < self.type_codes_min_reload_interval):
+            return False
+        if self.circuit_breaker is not None and self.circuit_breaker.rejects():
+            return False
+        try:
+            return self._reload_type_codes(registry.generation) is not registry
+        except breaker.CircuitOpenError:
+            LOGGER.debug('Logger circuit breaker rejected type codes reload.')
+            return False
+        except Exception as e:
+            LOGGER.error('Logger failed to error during type codes reload: %s.', e)
+            return False
+
+    def _get_request_type_code(self, service_name, request_type_name):
+        """Return (service code, request type code), reload the codes if they're unknown.
+
+        Raises ValueError if the codes are unknown.
+        """
+        for retry in (True, False):
+            try:
+                return self.request_type_codes[service_name][request_type_name]
+            except KeyError:
+                if not (retry and self._reload_on_miss()):
+                    raise ValueError(
+                        "Invalid service and/or request type '%s'-'%s'. Original exception: %s." %
+                        (service_name, request_type_name, traceback.format_exc()))
+
+    def _get_result_code(self, service_name, result):
+        """Return the result code, reload the codes if it's unknown."""
+        for retry in (True, False):
+            try:
+                return self.result_codes[service_name][result]
+            except KeyError:
+                if not (retry and self._reload_on_miss()):
+                    raise
+
+    def _load_request_type_codes(self, service_type, request_type_codes=None):
         """Load request_type mapping from the server.
 
         ([service name][request type name] -> (service int code, request type int code)
         """
-        logging.debug("<Logger %s> getRequestTypesByService %s" % (id(self), service_type.id))
-        request_type_list = self.dao.getRequestTypesByService(service_type.id)
+        if request_type_codes is None:
+            request_type_codes = self.request_type_codes
+        LOGGER.debug("<Logger %s> getRequestTypesByService %s", id(self), service_type.id)
+        request_type_list = self._call_dao(self.dao.getRequestTypesByService, 'getRequestTypesByService',
+                                           service_type.name, '', service_type.id)
         for request_type in request_type_list:
-            if self.request_type_codes.get(service_type.name) is None:
-                self.request_type_codes[service_type.name] = {}
-            self.request_type_codes[service_type.name][request_type.name] = (service_type.id, request_type.id)
+            if request_type_codes.get(service_type.name) is None:
+                request_type_codes[service_type.name] = {}
+            request_type_codes[service_type.name][request_type.name] = (service_type.id, request_type.id)
             # Keep codes for old service names.
-            if service_type.name == 'WebWhois':
-                self.request_type_codes['Web whois'][request_type.name] = (service_type.id, request_type.id)
-            if service_type.name == 'PublicRequest':
-                self.request_type_codes['Public Request'][request_type.name] = (service_type.id, request_type.id)
+            if service_type.name in typecodes.OLD_SERVICE_NAMES:
+                old_name = typecodes.OLD_SERVICE_NAMES[service_type.name]
+                request_type_codes.setdefault(old_name, {})[request_type.name] = (service_type.id, request_type.id)
 
-    def _load_result_codes(self, service_type):
+    def _load_result_codes(self, service_type, result_codes=None):
         """Load result_code mapping form the server.
 
         ([service name][result name] -> (service int code, result int code)
         """
-        logging.debug("<Logger %s> getResultCodesByService %s" % (id(self), service_type.id))
-        result_codes_list = self.dao.getResultCodesByService(service_type.id)
+        if result_codes is None:
+            result_codes = self.result_codes
+        LOGGER.debug("<Logger %s> getResultCodesByService %s", id(self), service_type.id)
+        result_codes_list = self._call_dao(self.dao.getResultCodesByService, 'getResultCodesByService',
+                                           service_type.name, '', service_type.id)
         for result_code in result_codes_list:
-            if self.result_codes.get(service_type.name) is None:
-                self.result_codes[service_type.name] = {}
-            self.result_codes[service_type.name][result_code.name] = result_code.result_code
+            if result_codes.get(service_type.name) is None:
+                result_codes[service_type.name] = {}
+            result_codes[service_type.name][result_code.name] = result_code.result_code
             # Keep codes for old service names.
-            if service_type.name == 'WebWhois':
-                self.result_codes['Web whois'][result_code.name] = result_code.result_code
-            if service_type.name == 'PublicRequest':
-                self.result_codes['Public Request'][result_code.name] = result_code.result_code
+            if service_type.name in typecodes.OLD_SERVICE_NAMES:
+                old_name = typecodes.OLD_SERVICE_NAMES[service_type.name]
+                result_codes.setdefault(old_name, {})[result_code.name] = result_code.result_code
 
     def _load_object_types(self):
         object_type_list = []
         for object_type in object_type_list:
             self.object_types[object_type.name] = object_type.id
 
-    def _convert_nested_to_str(self, value):
-        """Convert nested lists (or tuples) of objects to nested lists of strings."""
-        if isinstance(value, (datetime.date, datetime.datetime)):
-            return value.isoformat()
-        if not isinstance(value, list) and not isinstance(value, tuple):
-            return six.text_type(value)
-        return [self._convert_nested_to_str(item) for item in value]
-
     def _convert_property(self, name, value, child):
         """Convert input pareametrs to RequestProperty."""
-        if not isinstance(name, six.string_types):
-            name = six.text_type(name)
-        if not isinstance(value, six.string_types):
-            value = six.text_type(self._convert_nested_to_str(value))
-        name = u2c(name)
-        value = u2c(value)
-        prop = ccReg.RequestProperty(name, value, child)
-        return prop
+        return self.property_converter.convert_property(name, value, child)
 
     def convert_properties(self, properties):
         """Convert python list of [name, value, child] to list of RequestProperties (Output and child are optional)."""
-        converted_properties = []
-        if properties:
-            for prop in properties:
-                name = prop[0]
-                value = prop[1]
-                child = prop[2] if len(prop) > 2 else False
-                converted_property = self._convert_property(name, value, child)
-                converted_properties.append(converted_property)
-        return converted_properties
+        return self.property_converter.convert_properties(properties)
+
+    def iter_properties(self, properties):
+        """Yield RequestProperty for each [name, value, child] in python list, suitable for very long lists."""
+        return self.property_converter.iter_properties(properties or ())
 
     def convert_references(self, references):
         converted_references = []
@@ -269,27 +546,50 @@ class Logger(object):
         if session_id is None:
             session_id = 0
 
+        trace = self._start_trace('create_request', service_name, request_type_name)
         converted_properties = self.convert_properties(properties)
+        if trace is not None:
+            trace.phase(tracing.CONVERT_PROPERTIES)
+            trace.attributes['properties'] = len(converted_properties)
         converted_references = self.convert_references(references)
-        try:
-            service_code, request_type_code = self.request_type_codes[service_name][request_type_name]
-        except KeyError:
-            raise ValueError(
-                "Invalid service and/or request type '%s'-'%s'. Original exception: %s." %
-                (service_name, request_type_name, traceback.format_exc()))
-        logging.debug("<Logger %s> createRequest %s %s %s %s %s %s %s" % (
-            id(self), source_ip, service_code, content,
-            converted_properties, converted_references, request_type_code, session_id
-        ))
-        request_id = self.dao.createRequest(
-            source_ip, service_code, u2c(content), converted_properties, converted_references, request_type_code,
-            session_id)
+        if trace is not None:
+            trace.phase(tracing.CONVERT_REFERENCES)
+        service_code, request_type_code = self._get_request_type_code(service_name, request_type_name)
+        if trace is not None:
+            trace.phase(tracing.LOOKUP_CODES)
+        request_id = self._send_create_request(service_name, request_type_name, source_ip, content, service_code,
+                                               request_type_code, converted_properties, converted_references,
+                                               session_id)
+        if trace is not None:
+            self._finish_trace(trace, tracing.DAO_CALL)
         if request_id == 0:
             raise LoggingException(
                 "Failed to create a request with args: (%s, %s, %s, %s, %s, %s)." %
                 (source_ip, content, service_name, request_type_name, properties, session_id))
         return request_id
 
+    def _send_create_request(self, service_name, request_type_name, source_ip, content, service_code,
+                             request_type_code, converted_properties, converted_references, session_id):
+        """Send already converted request to the server and return its request id."""
+        if LOGGER.isEnabledFor(logging.DEBUG):
+            LOGGER.debug("<Logger %s> createRequest %s %s %s %s %s %s %s", id(self), source_ip, service_code, content,
+                         converted_properties, converted_references, request_type_code, session_id)
+        args = (source_ip, service_code, u2c(content), converted_properties, converted_references, request_type_code,
+                session_id)
+        return self._call_dao(self.dao.createRequest, 'createRequest', service_name, request_type_name, *args)
+
+    def _call_dao(self, function, method, service_name, request_type_name, *args):
+        """Call the DAO function, record it in metrics and pass it through the circuit breaker.
+
+        Raises CircuitOpenError if the circuit breaker rejects the call.
+        """
+        if self.metrics is not None:
+            args = (function, method, service_name, request_type_name) + args
+            function = self.metrics.call
+        if self.circuit_breaker is None:
+            return function(*args)
+        return self.circuit_breaker.call(function, *args)
+
 
 class LogRequest(object):
     """A request for logging.
@@ -314,13 +614,57 @@ class LogRequest(object):
             a string description of what happened.
     """
 
+    # Many requests may be in flight at once, keep them small.
+    __slots__ = ('logger', 'request_id', 'service', 'request_type', 'result', '_added')
+
     def __init__(self, logger, request_id, service, request_type, default_result):
         self.logger = logger
-        self.dao = logger.dao
         self.request_id = request_id
         self.service = service
         self.request_type = request_type
         self.result = default_result
+        # Properties and references added before close - [converted properties, converted references].
+        self._added = None
+
+    @property
+    def dao(self):
+        return self.logger.dao
+
+    def add_properties(self, properties):
+        """Add output properties of this request, which are sent on close.
+
+        Properties are converted immediately. If the DAO supports `addRequestProperties`, they are sent to the server
+        in chunks of Logger.property_chunk_size items, once the request is created on the server.
+        Otherwise all added properties are kept in memory until close, their number is not bounded.
+        """
+        if self._added is None:
+            self._added = [[], []]
+        self._added[0].extend(self.logger.iter_properties(properties))
+        self._send_added()
+
+    def add_references(self, references):
+        """Add output references of this request, which are sent on close."""
+        if self._added is None:
+            self._added = [[], []]
+        self._added[1].extend(self.logger.convert_references(references))
+        self._send_added()
+
+    def _send_added(self):
+        """Send the added properties and references, if there is enough of them and the DAO supports it."""
+        add_request_properties = getattr(self.dao, 'addRequestProperties', None)
+        if add_request_properties is None or sum(len(items) for items in self._added) < self.logger.property_chunk_size:
+            return
+        request_id = self._known_request_id()
+        if not request_id or request_id < 0:
+            # The request is not created on the server yet, failed to be created or has a local id of a spool.
+            return
+        self.logger._call_dao(add_request_properties, 'addRequestProperties', self.service, self.request_type,
+                              request_id, self._added[0], self._added[1])
+        self._added = None
+
+    def _known_request_id(self):
+        """Return request ID, if it's known, without creating the request or waiting for it."""
+        return self.request_id
 
     def close(self, result=None, content="", properties=None, references=None, session_id=None):
         """Close this logging request.
@@ -329,22 +673,231 @@ class LogRequest(object):
         """
         if result is not None:
             self.result = result
-        result_code = self.logger.result_codes[self.service][self.result]
+        trace = self.logger._start_trace('close_request', self.service, self.request_type)
+        result_code = self.logger._get_result_code(self.service, self.result)
+        if trace is not None:
+            trace.phase(tracing.LOOKUP_CODES)
         converted_properties = self.logger.convert_properties(properties)
+        if trace is not None:
+            trace.phase(tracing.CONVERT_PROPERTIES)
         converted_references = self.logger.convert_references(references)
+        if trace is not None:
+            trace.phase(tracing.CONVERT_REFERENCES)
+        if self._added is not None:
+            converted_properties = self._added[0] + converted_properties
+            converted_references = self._added[1] + converted_references
+            self._added = None
+        if trace is not None:
+            trace.attributes['properties'] = len(converted_properties)
         if not session_id:
             session_id = 0
-        logging.debug("<Logger %s> closeRequest %s %s %s %s %s %s" % (
-            id(self), self.request_id, content, converted_properties, converted_references, result_code, session_id
-        ))
-        self.dao.closeRequest(self.request_id, u2c(content),
-                              converted_properties, converted_references, result_code, session_id)
+        self._send_close_request(content, converted_properties, converted_references, result_code, session_id)
+        if trace is not None:
+            self.logger._finish_trace(trace, tracing.DAO_CALL)
+
+    def _send_close_request(self, content, converted_properties, converted_references, result_code, session_id):
+        """Send already converted close of this request to the server."""
+        if LOGGER.isEnabledFor(logging.DEBUG):
+            LOGGER.debug("<Logger %s> closeRequest %s %s %s %s %s %s", id(self), self.request_id, content,
+                         converted_properties, converted_references, result_code, session_id)
+        args = (self.request_id, u2c(content), converted_properties, converted_references, result_code, session_id)
+        self.logger._call_dao(self.dao.closeRequest, 'closeRequest', self.service, self.request_type, *args)
+
+
+class DeferredLogRequest(LogRequest):
+    """A request for logging, which is created on the server only when it's closed or its request_id is read.
+
+    Create and close of a request, which is closed without reading its request_id, are sent back to back.
+
+    Should NOT be instantiated directly; use Logger.create_request with deferred=True.
+    """
+
+    __slots__ = ('_request_id', 'create_args', 'default_result', 'fail_silent')
+
+    # Whether reading request_id creates the request on the server.
+    create_on_read = True
+
+    def __init__(self, logger, create_args, service, request_type, default_result, fail_silent=False):
+        LogRequest.__init__(self, logger, None, service, request_type, default_result)
+        self.create_args = create_args
+        self.default_result = default_result
+        self.fail_silent = fail_silent
+
+    @property
+    def request_id(self):
+        """Return request ID, create the request on the server if necessary."""
+        if self._request_id is None and self.create_on_read:
+            try:
+                self.flush()
+            except Exception as e:
+                if not self.fail_silent:
+                    raise
+                self._log_error('create_request', e)
+                self._request_id = 0
+        return self._request_id or 0
+
+    @request_id.setter
+    def request_id(self, value):
+        self._request_id = value
+
+    def _known_request_id(self):
+        return self._request_id
+
+    def flush(self):
+        """Create the request on the server, unless it's created already."""
+        if self._request_id is None:
+            self._request_id = self.logger._server_create_request(*self.create_args)
+
+    def add_properties(self, properties):
+        try:
+            LogRequest.add_properties(self, properties)
+        except Exception as e:
+            if not self.fail_silent:
+                raise
+            self._log_error('request.add_properties', e)
+
+    def add_references(self, references):
+        try:
+            LogRequest.add_references(self, references)
+        except Exception as e:
+            if not self.fail_silent:
+                raise
+            self._log_error('request.add_references', e)
+
+    def close(self, result=None, content="", properties=None, references=None, session_id=None):
+        """Create the request on the server, if necessary, and close it."""
+        if result is not None:
+            self.result = result
+        try:
+            if self._request_id is None:
+                if not self._should_log():
+                    return
+                self.flush()
+            if self._request_id:
+                LogRequest.close(self, content=content, properties=properties, references=references,
+                                 session_id=session_id)
+        except Exception as e:
+            if not self.fail_silent:
+                raise
+            self._log_error('request.close', e)
+
+    def _log_error(self, operation, error):
+        if isinstance(error, breaker.CircuitOpenError):
+            LOGGER.debug('Logger circuit breaker rejected %s.', operation)
+        else:
+            LOGGER.error('Logger failed to error during %s: %s.', operation, error)
+
+    def _should_log(self):
+        """Return whether the request, which is not created yet, should be logged on close."""
+        return True
+
+
+class ConditionalLogRequest(DeferredLogRequest):
+    """A request for logging, which is created on the server on close, if its sampling policy decides so.
+
+    Its request ID is 0 until it's closed.
+
+    Should NOT be instantiated directly; use Logger.create_request with a sampling policy.
+    """
+
+    __slots__ = ('policy',)
+
+    create_on_read = False
+
+    def __init__(self, logger, policy, create_args, service, request_type, default_result, fail_silent=False):
+        DeferredLogRequest.__init__(self, logger, create_args, service, request_type, default_result,
+                                    fail_silent=fail_silent)
+        self.policy = policy
+
+    def _should_log(self):
+        return self.policy.decide_result(self.result, self.default_result)
+
+
+class RequestTemplate(object):
+    """Factory of requests of a single service and request type.
+
+    Should NOT be instantiated directly; use Logger.template.
+    """
+
+    request_class = LogRequest
+    # Whether requests deferred by a sampling policy don't raise on failure.
+    fail_silent = False
+
+    def __init__(self, logger, service_name, request_type_name, static_properties=None, static_references=None,
+                 default_result=None):
+        self.logger = logger
+        # Unconverted static properties and references for requests deferred by a sampling policy.
+        self.raw_static_properties = list(static_properties or ())
+        self.raw_static_references = list(static_references or ())
+        self.service = service_name
+        self.request_type = request_type_name
+        self.default_result = logger._get_default_result(service_name, default_result)
+        self.service_code, self.request_type_code = logger._get_request_type_code(service_name, request_type_name)
+        self.static_properties = logger.convert_properties(static_properties)
+        self.static_references = logger.convert_references(static_references)
+
+    def __call__(self, source_ip, properties=None, references=None, session_id=None, content=''):
+        """Create a request object on the server.
+
+        Properties and references are appended to the static ones.
+        Returns a new LogRequest object.
+        """
+        sampled_request = self._sample_request(source_ip, properties, references, session_id, content)
+        if sampled_request is not None:
+            return sampled_request
+        request_id = self._create_request_id(source_ip, properties, references, session_id, content)
+        return self.request_class(self.logger, request_id, self.service, self.request_type, self.default_result)
+
+    def _sample_request(self, source_ip, properties, references, session_id, content):
+        """Apply the sampling policy of the logger, return a request not created yet or None."""
+        if not self.logger.policies:
+            return None
+        create_args = (source_ip, content, self.service, self.request_type,
+                       self.raw_static_properties + list(properties or ()),
+                       self.raw_static_references + list(references or ()), session_id)
+        return self.logger._sample_request(self.service, self.request_type, self.default_result, create_args,
+                                           fail_silent=self.fail_silent)
+
+    def _create_request_id(self, source_ip, properties, references, session_id, content):
+        """Create the request on the server and return its request id."""
+        if content is None:
+            content = ""
+        if session_id is None:
+            session_id = 0
+        trace = self.logger._start_trace('create_request', self.service, self.request_type)
+        converted_properties = self.static_properties + self.logger.convert_properties(properties)
+        if trace is not None:
+            trace.phase(tracing.CONVERT_PROPERTIES)
+            trace.attributes['properties'] = len(converted_properties)
+        converted_references = self.static_references + self.logger.convert_references(references)
+        if trace is not None:
+            trace.phase(tracing.CONVERT_REFERENCES)
+        request_id = self.logger._send_create_request(self.service, self.request_type, source_ip, content,
+                                                      self.service_code, self.request_type_code,
+                                                      converted_properties, converted_references, session_id)
+        if trace is not None:
+            self.logger._finish_trace(trace, tracing.DAO_CALL)
+        if request_id == 0:
+            raise LoggingException(
+                "Failed to create a request with args: (%s, %s, %s, %s, %s, %s)." %
+                (source_ip, content, self.service, self.request_type, converted_properties, session_id))
+        return request_id
 
 
 class LoggerFailSilent(Logger):
-    """Logger that does not raise exceptions on failure."""
+    """Logger that does not raise exceptions on failure.
+
+    With a circuit breaker, calls to a failing server are not even tried and dummy requests are returned
+    immediately.
+    """
 
     def __init__(self, *args, **kwargs):
+        """Init LoggerFailSilent.
+
+        Takes the arguments of Logger and:
+            circuit_breaker: CircuitBreaker of the calls to the server.
+        """
+        self.circuit_breaker = kwargs.pop('circuit_breaker', None)
         Logger.__init__(self, *args, **kwargs)
 
     def start_session(self, *args, **kwargs):
@@ -352,50 +905,124 @@ class LoggerFailSilent(Logger):
             return Logger.start_session(self, *args, **kwargs)
         except LoggingException:
             pass
+        except breaker.CircuitOpenError:
+            LOGGER.debug('Logger circuit breaker rejected start_session.')
         except omniORB.CORBA.SystemException:
             # TODO: Re-think somehow?
             # I have to reraise it, so that I know in ADIF.login that I should
             # hide away the logger...
             raise
         except Exception as e:
-            logging.error('Logger failed to error during start_session: %s.', e)
+            LOGGER.error('Logger failed to error during start_session: %s.', e)
 
     def create_request(self, source_ip, service_name, request_type_name,
                        properties=None, references=None, session_id=None,
-                       default_result=None, content=''):
+                       default_result=None, content='', deferred=False):
+        if self.circuit_breaker is not None and self.circuit_breaker.rejects():
+            return dummylogger.DummyLogRequest()
         try:
-            if default_result is None:
-                default_result = self.default_results.get(service_name)
-                if default_result is None:
-                    raise LoggingException('Service "%s" doesn\'t have specified default result code!' % service_name)
-
+            default_result = self._get_default_result(service_name, default_result)
             properties = properties or []
+            create_args = (source_ip, content, service_name, request_type_name, properties, references, session_id)
+            if self.policies:
+                sampled_request = self._sample_request(service_name, request_type_name, default_result, create_args,
+                                                       fail_silent=True)
+                if sampled_request is not None:
+                    return sampled_request
+            if deferred:
+                self._get_request_type_code(service_name, request_type_name)
+                return DeferredLogRequest(self, create_args, service_name, request_type_name, default_result,
+                                          fail_silent=True)
             request_id = self._server_create_request(
                 source_ip, content, service_name, request_type_name, properties, references, session_id)
             log_request = LogRequestFailSilent(self, request_id, service_name, request_type_name, default_result)
             return log_request
+        except breaker.CircuitOpenError:
+            LOGGER.debug('Logger circuit breaker rejected create_request.')
+            return dummylogger.DummyLogRequest()
         except Exception as e:
-            logging.error('Logger failed to error during create_request: %s.', e)
+            LOGGER.error('Logger failed to error during create_request: %s.', e)
             return dummylogger.DummyLogRequest()
 
+    def template(self, service_name, request_type_name, static_properties=None, static_references=None,
+                 default_result=None):
+        """Return a factory of requests of the service and request type, which does not raise on failure."""
+        return RequestTemplateFailSilent(self, service_name, request_type_name, static_properties, static_references,
+                                         default_result)
+
     def close_session(self, *args, **kwargs):
         try:
             Logger.close_session(self, *args, **kwargs)
+        except breaker.CircuitOpenError:
+            LOGGER.debug('Logger circuit breaker rejected close_session.')
         except Exception as e:
-            logging.error('Logger failed to error during close_session: %s.', e)
+            LOGGER.error('Logger failed to error during close_session: %s.', e)
 
 
 class LogRequestFailSilent(LogRequest):
     """LogRequest that does not raise exceptions on failure (to be used with LoggerFailSilent)."""
 
+    __slots__ = ()
+
     def __init__(self, *args, **kwargs):
         LogRequest.__init__(self, *args, **kwargs)
 
     def close(self, *args, **kwargs):
         try:
             LogRequest.close(self, *args, **kwargs)
+        except breaker.CircuitOpenError:
+            LOGGER.debug('Logger circuit breaker rejected request.close.')
+        except Exception as e:
+            LOGGER.error('Logger failed to error during request.close: %s.', e)
+
+    def add_properties(self, *args, **kwargs):
+        try:
+            LogRequest.add_properties(self, *args, **kwargs)
+        except Exception as e:
+            LOGGER.error('Logger failed to error during request.add_properties: %s.', e)
+
+    def add_references(self, *args, **kwargs):
+        try:
+            LogRequest.add_references(self, *args, **kwargs)
+        except Exception as e:
+            LOGGER.error('Logger failed to error during request.add_references: %s.', e)
+
+
+class RequestTemplateFailSilent(RequestTemplate):
+    """RequestTemplate that does not raise exceptions on failure (to be used with LoggerFailSilent).
+
+    If the codes can't be resolved, e.g. the request type is unknown or the server is down, the template returns
+    dummy requests and tries to resolve the codes again on each call.
+    """
+
+    request_class = LogRequestFailSilent
+    fail_silent = True
+
+    def __init__(self, logger, *args):
+        self.logger = logger
+        # Arguments of the template, which failed to resolve its codes.
+        self._unresolved = None
+        try:
+            RequestTemplate.__init__(self, logger, *args)
+        except Exception as e:
+            LOGGER.error('Logger failed to error during template: %s.', e)
+            self._unresolved = args
+
+    def __call__(self, *args, **kwargs):
+        circuit_breaker = self.logger.circuit_breaker
+        if circuit_breaker is not None and circuit_breaker.rejects():
+            return dummylogger.DummyLogRequest()
+        try:
+            if self._unresolved is not None:
+                RequestTemplate.__init__(self, self.logger, *self._unresolved)
+                self._unresolved = None
+            return RequestTemplate.__call__(self, *args, **kwargs)
+        except breaker.CircuitOpenError:
+            LOGGER.debug('Logger circuit breaker rejected create_request.')
+            return dummylogger.DummyLogRequest()
         except Exception as e:
-            logging.error('Logger failed to error during request.close: %s.', e)
+            LOGGER.error('Logger failed to error during create_request: %s.', e)
+            return dummylogger.DummyLogRequest()
 
 
 class LoggingException(Exception):
@@ -46,16 +46,71 @@ class DummyLogger(object):
     def create_dummy_request(self, *args, **kwargs):
         return DummyLogRequest()
 
+    def template(self, *args, **kwargs):
+        return self.create_request
+
+    def acquire_session(self, *args, **kwargs):
+        pass
+
+    def release_session(self, *args, **kwargs):
+        pass
+
     def close_session(self, *args, **kwargs):
         pass
 
 
 class DummyLogRequest(object):
+    """Dummy LogRequest. All dummy requests are the same shared object without any state."""
+
+    __slots__ = ()
+
+    def __new__(cls, *args, **kwargs):
+        # Each subclass has its own instance.
+        if '_instance' not in cls.__dict__:
+            cls._instance = super(DummyLogRequest, cls).__new__(cls)
+        return cls._instance
+
     def __init__(self, *args, **kwargs):
-        self.request_id = 0
-        self.service = ''
-        self.request_type = ''
-        self.result = ''
+        pass
+
+    # Attributes of a dummy request are constant, values set by the caller are ignored.
+    @property
+    def request_id(self):
+        return 0
+
+    @request_id.setter
+    def request_id(self, value):
+        pass
+
+    @property
+    def service(self):
+        return ''
+
+    @service.setter
+    def service(self, value):
+        pass
+
+    @property
+    def request_type(self):
+        return ''
+
+    @request_type.setter
+    def request_type(self, value):
+        pass
+
+    @property
+    def result(self):
+        return ''
+
+    @result.setter
+    def result(self, value):
+        pass
+
+    def add_properties(self, *args, **kwargs):
+        pass
+
+    def add_references(self, *args, **kwargs):
+        pass
 
     def close(self, *args, **kwargs):
         pass
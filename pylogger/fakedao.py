@@ -0,0 +1,133 @@
+#
+# Copyright (C) 2022  CZ.NIC, z. s. p. o.
+#
+# This file is part of FRED.
+#
+# FRED is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# FRED is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with FRED.  If not, see <https://www.gnu.org/licenses/>.
+"""In-process fake of the logger Data Access Object for tests and benchmarks."""
+from __future__ import unicode_literals
+
+import itertools
+import random
+import threading
+import time
+from collections import Counter
+
+__all__ = ["FakeDao", "FakeDaoError"]
+
+DEFAULT_SERVICES = ('EPP', 'WebWhois', 'PublicRequest', 'MojeID', 'WebAdmin', 'Admin', 'RDAP', 'Domainbrowser')
+DEFAULT_REQUEST_TYPES = ('DomainCreate', 'DomainInfo', 'DomainUpdate', 'NSsetUpdate', 'ContactInfo', 'Login')
+DEFAULT_RESULTS = ('Success', 'Error', 'CommandFailed', 'InternalServerError', 'Ok', 'Fail')
+
+
+class FakeDaoError(Exception):
+    """Error injected by FakeDao."""
+
+
+class _Record(object):
+    """Structure returned by the FakeDao, e.g. service type or request type."""
+
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class FakeDao(object):
+    """Fake of the logger Data Access Object with configurable latency and failures.
+
+    Example:
+        dao = FakeDao(latency=0.001, failure_rate=0.01, fail_methods=['createRequest'])
+        logger = Logger(dao)
+
+    Attributes:
+        calls: Counter of calls by method name.
+        requests: Dictionary request id -> 'open' or 'closed'.
+        sessions: Dictionary session id -> 'open' or 'closed'.
+    """
+
+    def __init__(self, services=DEFAULT_SERVICES, request_types=DEFAULT_REQUEST_TYPES, results=DEFAULT_RESULTS,
+                 latency=0, failure_rate=0, fail_methods=None, seed=None, track=True):
+        """Init FakeDao.
+
+        Arguments:
+            services: Names of services.
+            request_types: Names of request types of each service.
+            results: Names of results of each service.
+            latency: Number of seconds each call takes or a callable, which returns it.
+            failure_rate: Probability a call raises FakeDaoError.
+            fail_methods: Names of methods, which may fail. All methods by default.
+            seed: Seed of the random generator of failures.
+            track: Whether to track the state of requests and sessions.
+        """
+        self.services = list(services)
+        self.request_types = list(request_types)
+        self.results = list(results)
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.fail_methods = None if fail_methods is None else frozenset(fail_methods)
+        self.track = track
+        self.calls = Counter()
+        self.requests = {}
+        self.sessions = {}
+        self._random = random.Random(seed)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _call(self, method):
+        """Record the call, wait and inject failures."""
+        with self._lock:
+            self.calls[method] += 1
+            fail = (self.failure_rate and (self.fail_methods is None or method in self.fail_methods)
+                    and self._random.random() < self.failure_rate)
+        latency = self.latency() if callable(self.latency) else self.latency
+        if latency:
+            time.sleep(latency)
+        if fail:
+            raise FakeDaoError("Injected failure of %s." % method)
+
+    def getServices(self):
+        self._call('getServices')
+        return [_Record(id=number, name=name) for number, name in enumerate(self.services, 1)]
+
+    def getRequestTypesByService(self, service_id):
+        self._call('getRequestTypesByService')
+        return [_Record(id=service_id * 1000 + number, name=name) for number, name in enumerate(self.request_types, 1)]
+
+    def getResultCodesByService(self, service_id):
+        self._call('getResultCodesByService')
+        return [_Record(name=name, result_code=service_id * 1000 + number)
+                for number, name in enumerate(self.results, 1)]
+
+    def createSession(self, user_id, username):
+        self._call('createSession')
+        session_id = next(self._ids)
+        if self.track:
+            self.sessions[session_id] = 'open'
+        return session_id
+
+    def closeSession(self, session_id):
+        self._call('closeSession')
+        if self.track:
+            self.sessions[session_id] = 'closed'
+
+    def createRequest(self, source_ip, service_id, content, properties, references, request_type_id, session_id):
+        self._call('createRequest')
+        request_id = next(self._ids)
+        if self.track:
+            self.requests[request_id] = 'open'
+        return request_id
+
+    def closeRequest(self, request_id, content, properties, references, result_code, session_id):
+        self._call('closeRequest')
+        if self.track:
+            self.requests[request_id] = 'closed'
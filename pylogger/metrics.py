@@ -0,0 +1,167 @@
+#
+# Copyright (C) 2022  CZ.NIC, z. s. p. o.
+#
+# This file is part of FRED.
+#
+# FRED is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# FRED is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with FRED.  If not, see <https://www.gnu.org/licenses/>.
+"""Latency and throughput metrics of logger DAO calls."""
+from __future__ import unicode_literals
+
+import socket
+import threading
+from bisect import bisect_left
+from timeit import default_timer
+
+__all__ = ["DaoMetrics", "format_prometheus", "format_statsd", "send_statsd"]
+
+# Upper bounds of histogram buckets in seconds.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _CallStats(object):
+    """Statistics of calls of a single method, service and request type."""
+
+    __slots__ = ('count', 'errors', 'total', 'buckets')
+
+    def __init__(self, size):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        # The last bucket is for durations above the largest bound.
+        self.buckets = [0] * (size + 1)
+
+
+class DaoMetrics(object):
+    """Collector of call counts, error counts and latency histograms of DAO calls.
+
+    Calls are keyed by the DAO method name, service name and request type name.
+    Session calls have empty service and request type.
+
+    Example:
+        metrics = DaoMetrics()
+        logger = Logger(dao, metrics=metrics)
+        ...
+        print(format_prometheus(metrics))
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """Init DaoMetrics.
+
+        Arguments:
+            buckets: Sorted upper bounds of histogram buckets in seconds.
+        """
+        self.buckets = tuple(buckets)
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def call(self, function, method, service, request_type, *args):
+        """Call the function with arguments and record its duration."""
+        start = default_timer()
+        try:
+            result = function(*args)
+        except Exception:
+            self.observe(method, service, request_type, default_timer() - start, error=True)
+            raise
+        self.observe(method, service, request_type, default_timer() - start)
+        return result
+
+    def observe(self, method, service, request_type, duration, error=False):
+        """Record a single call."""
+        index = bisect_left(self.buckets, duration)
+        key = (method, service, request_type)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = _CallStats(len(self.buckets))
+            stats.count += 1
+            stats.total += duration
+            stats.buckets[index] += 1
+            if error:
+                stats.errors += 1
+
+    def snapshot(self):
+        """Return recorded statistics.
+
+        Returns dictionary (method, service, request type) -> dictionary with keys
+        'count', 'errors', 'sum' (total duration in seconds) and 'buckets',
+        list of (upper bound, cumulative count) pairs, where the last upper bound is infinity.
+        """
+        bounds = self.buckets + (float('inf'), )
+        result = {}
+        with self._lock:
+            for key, stats in self._stats.items():
+                cumulative = 0
+                buckets = []
+                for bound, count in zip(bounds, stats.buckets):
+                    cumulative += count
+                    buckets.append((bound, cumulative))
+                result[key] = {'count': stats.count, 'errors': stats.errors, 'sum': stats.total, 'buckets': buckets}
+        return result
+
+    def reset(self):
+        """Drop all recorded statistics."""
+        with self._lock:
+            self._stats = {}
+
+    def _after_fork(self):
+        # The lock may have been held by another thread of the parent, statistics belong to the parent.
+        self._lock = threading.Lock()
+        self._stats = {}
+
+
+def _escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_prometheus(metrics, prefix='pylogger_dao'):
+    """Return metrics in Prometheus text exposition format."""
+    duration = prefix + '_call_duration_seconds'
+    errors = prefix + '_call_errors_total'
+    duration_lines = ['# HELP %s Duration of logger DAO calls.' % duration, '# TYPE %s histogram' % duration]
+    error_lines = ['# HELP %s Number of failed logger DAO calls.' % errors, '# TYPE %s counter' % errors]
+    for (method, service, request_type), stats in sorted(metrics.snapshot().items()):
+        labels = 'method="%s",service="%s",request_type="%s"' % (
+            _escape_label(method), _escape_label(service), _escape_label(request_type))
+        for bound, count in stats['buckets']:
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            duration_lines.append('%s_bucket{%s,le="%s"} %d' % (duration, labels, le, count))
+        duration_lines.append('%s_sum{%s} %r' % (duration, labels, stats['sum']))
+        duration_lines.append('%s_count{%s} %d' % (duration, labels, stats['count']))
+        error_lines.append('%s{%s} %d' % (errors, labels, stats['errors']))
+    return '\n'.join(duration_lines + error_lines) + '\n'
+
+
+def _statsd_name(value):
+    return value.replace('.', '_').replace(' ', '_').replace(':', '_').replace('|', '_') or 'none'
+
+
+def format_statsd(metrics, prefix='pylogger'):
+    """Return metrics as list of statsd gauges."""
+    lines = []
+    for (method, service, request_type), stats in sorted(metrics.snapshot().items()):
+        name = '.'.join((prefix, _statsd_name(method), _statsd_name(service), _statsd_name(request_type)))
+        lines.append('%s.count:%d|g' % (name, stats['count']))
+        lines.append('%s.errors:%d|g' % (name, stats['errors']))
+        lines.append('%s.duration_ms:%f|g' % (name, stats['sum'] * 1000))
+    return lines
+
+
+def send_statsd(metrics, host='localhost', port=8125, prefix='pylogger'):
+    """Send metrics as statsd gauges over UDP."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        for line in format_statsd(metrics, prefix):
+            sock.sendto(line.encode('utf-8'), (host, port))
+    finally:
+        sock.close()
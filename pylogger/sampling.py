@@ -0,0 +1,159 @@
+#
+# Copyright (C) 2022  CZ.NIC, z. s. p. o.
+#
+# This file is part of FRED.
+#
+# FRED is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# FRED is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with FRED.  If not, see <https://www.gnu.org/licenses/>.
+"""Sampling and rate limiting policies of logged requests."""
+from __future__ import unicode_literals
+
+import threading
+from timeit import default_timer
+
+__all__ = ["AlwaysLog", "NonDefaultResultOnly", "SampleOneInN", "SamplingPolicy", "TokenBucket"]
+
+# Decisions of the policies.
+# Log the request.
+LOG = 'log'
+# Don't log the request.
+DROP = 'drop'
+# Decide when the request is closed.
+DEFER = 'defer'
+
+
+class SamplingPolicy(object):
+    """Base class of sampling policies.
+
+    Policy decides whether a request is logged when the request is created. If the decision is deferred,
+    the policy decides again on close, based on the result.
+
+    Attributes:
+        logged: Number of logged requests.
+        dropped: Number of requests, which were not logged.
+    """
+
+    def __init__(self):
+        self.logged = 0
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def decide(self):
+        """Return decision on a created request - LOG, DROP or DEFER. Logs all requests by default."""
+        self._count(True)
+        return LOG
+
+    def decide_result(self, result, default_result):
+        """Return whether a request with deferred decision is logged, when it's closed."""
+        self._count(True)
+        return True
+
+    def stats(self):
+        """Return dictionary with counters of the policy."""
+        with self._lock:
+            return {'logged': self.logged, 'dropped': self.dropped}
+
+    def _count(self, logged):
+        with self._lock:
+            if logged:
+                self.logged += 1
+            else:
+                self.dropped += 1
+
+    def _after_fork(self):
+        # The lock may have been held by another thread of the parent.
+        self._lock = threading.Lock()
+
+
+class AlwaysLog(SamplingPolicy):
+    """Log all requests."""
+
+
+class SampleOneInN(SamplingPolicy):
+    """Log every n-th request."""
+
+    def __init__(self, n):
+        """Init SampleOneInN.
+
+        Arguments:
+            n: Only one of n requests is logged, at least 1.
+        """
+        if n < 1:
+            raise ValueError("Sample size must be at least 1, not %s." % n)
+        super(SampleOneInN, self).__init__()
+        self.n = n
+        self._counter = 0
+
+    def decide(self):
+        with self._lock:
+            self._counter = (self._counter + 1) % self.n
+            logged = self._counter == 1 % self.n
+            if logged:
+                self.logged += 1
+            else:
+                self.dropped += 1
+        return LOG if logged else DROP
+
+
+class TokenBucket(SamplingPolicy):
+    """Log at most `rate` requests per second with bursts up to `burst` requests."""
+
+    def __init__(self, rate, burst=None):
+        """Init TokenBucket.
+
+        Arguments:
+            rate: Number of tokens added per second.
+            burst: Maximal number of tokens in the bucket. Equals to rate by default.
+        """
+        super(TokenBucket, self).__init__()
+        self.rate = rate
+        self.burst = rate if burst is None else burst
+        self._tokens = self.burst
+        self._updated = default_timer()
+
+    def decide(self):
+        with self._lock:
+            now = default_timer()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            logged = self._tokens >= 1
+            if logged:
+                self._tokens -= 1
+                self.logged += 1
+            else:
+                self.dropped += 1
+        return LOG if logged else DROP
+
+
+class NonDefaultResultOnly(SamplingPolicy):
+    """Log only requests closed with other than default result.
+
+    The request is created on the server only when it's closed, its request ID is 0 until then.
+    """
+
+    def __init__(self, ignored_results=()):
+        """Init NonDefaultResultOnly.
+
+        Arguments:
+            ignored_results: Other results, which are not logged, e.g. 'Success'.
+        """
+        super(NonDefaultResultOnly, self).__init__()
+        self.ignored_results = frozenset(ignored_results)
+
+    def decide(self):
+        return DEFER
+
+    def decide_result(self, result, default_result):
+        logged = result != default_result and result not in self.ignored_results
+        self._count(logged)
+        return logged
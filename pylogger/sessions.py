@@ -0,0 +1,204 @@
+#
+# Copyright (C) 2022  CZ.NIC, z. s. p. o.
+#
+# This file is part of FRED.
+#
+# FRED is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# FRED is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with FRED.  If not, see <https://www.gnu.org/licenses/>.
+"""Cache of logging sessions shared by requests of the same user."""
+from __future__ import division, unicode_literals
+
+import logging
+import os
+import threading
+import time
+import weakref
+
+__all__ = ["SessionCache"]
+
+LOGGER = logging.getLogger(__name__)
+
+# Session caches of this process, which are reset after fork.
+_caches = weakref.WeakSet()
+
+
+def _after_fork():
+    for cache in list(_caches):
+        cache._after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+class _CachedSession(object):
+    """Open session with its users."""
+
+    __slots__ = ('key', 'session_id', 'refcount', 'last_used')
+
+    def __init__(self, key, session_id):
+        self.key = key
+        self.session_id = session_id
+        self.refcount = 1
+        self.last_used = time.time()
+
+
+class SessionCache(object):
+    """Cache of open logging sessions keyed by user ID and username.
+
+    An acquired session is shared by all users of the same key until all of them release it. A session, which is not
+    used for `idle_timeout` seconds, expires. Expired sessions are closed in batches by a background sweeper.
+
+    Example:
+        logger = Logger(dao, session_cache=SessionCache(idle_timeout=60))
+        session_id = logger.acquire_session(user_id, username)
+        try:
+            ...
+        finally:
+            logger.release_session(session_id)
+
+    Attributes:
+        started: Number of started sessions.
+        reused: Number of acquires of already open sessions.
+        expired: Number of expired sessions.
+    """
+
+    def __init__(self, idle_timeout=60, sweep_interval=None):
+        """Init SessionCache.
+
+        Arguments:
+            idle_timeout: Number of seconds after which an unused session expires.
+            sweep_interval: Number of seconds between closes of expired sessions. Half of idle_timeout by default.
+        """
+        self.idle_timeout = idle_timeout
+        self.sweep_interval = idle_timeout / 2 if sweep_interval is None else sweep_interval
+        self.started = 0
+        self.reused = 0
+        self.expired = 0
+        self._sessions = {}
+        self._by_id = {}
+        # Sessions to be closed, which were started concurrently with another one of the same key.
+        self._duplicates = []
+        self._lock = threading.Lock()
+        self._close = None
+        self._thread = None
+        self._stopped = threading.Event()
+        _caches.add(self)
+
+    def acquire(self, user_id, username, start):
+        """Return ID of an open session of the user, start a new one by the start callable if necessary."""
+        key = (user_id, username)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is not None:
+                session.refcount += 1
+                self.reused += 1
+                return session.session_id
+        session_id = start()
+        if not session_id:
+            return session_id
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is not None:
+                # Other thread has started a session meanwhile.
+                session.refcount += 1
+                self._duplicates.append(session_id)
+                return session.session_id
+            session = _CachedSession(key, session_id)
+            self._sessions[key] = session
+            self._by_id[session_id] = session
+            self.started += 1
+        return session_id
+
+    def release(self, session_id):
+        """Release the session.
+
+        Return False if the session isn't in the cache and should be closed, e.g. once the sweeper is stopped.
+        """
+        with self._lock:
+            session = self._by_id.get(session_id)
+            if session is None:
+                return False
+            if session.refcount <= 0:
+                LOGGER.warning('Logger session %s released more times than acquired.', session_id)
+                return True
+            session.refcount -= 1
+            session.last_used = time.time()
+            if session.refcount <= 0 and self._stopped.is_set():
+                del self._sessions[session.key]
+                del self._by_id[session_id]
+                return False
+        return True
+
+    def pop_expired(self, idle_timeout=None):
+        """Remove expired sessions from the cache and return their IDs.
+
+        Arguments:
+            idle_timeout: Number of seconds after which an unused session expires. The cache's one by default.
+        """
+        if idle_timeout is None:
+            idle_timeout = self.idle_timeout
+        now = time.time()
+        with self._lock:
+            expired = [s for s in self._sessions.values() if s.refcount <= 0 and now - s.last_used >= idle_timeout]
+            for session in expired:
+                del self._sessions[session.key]
+                del self._by_id[session.session_id]
+            self.expired += len(expired)
+            session_ids = self._duplicates + [s.session_id for s in expired]
+            self._duplicates = []
+        return session_ids
+
+    def sweep(self, close, idle_timeout=None):
+        """Close the expired sessions by the close callable."""
+        for session_id in self.pop_expired(idle_timeout):
+            try:
+                close(session_id)
+            except Exception as error:
+                LOGGER.error('Logger failed to error during close of expired session: %s.', error)
+
+    def start(self, close):
+        """Start the background sweeper, which closes the expired sessions by the close callable."""
+        self._close = close
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name='pylogger-sessions')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """Stop the background sweeper and close all unused sessions."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        if self._close is not None:
+            self.sweep(self._close, idle_timeout=0)
+
+    def stats(self):
+        """Return dictionary with counters of the cache."""
+        with self._lock:
+            return {'open': len(self._sessions), 'started': self.started, 'reused': self.reused,
+                    'expired': self.expired}
+
+    def _run(self):
+        while not self._stopped.wait(self.sweep_interval):
+            self.sweep(self._close)
+
+    def _after_fork(self):
+        # Sessions belong to the parent, which closes them.
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._by_id = {}
+        self._duplicates = []
+        if self._thread is not None:
+            self.start(self._close)
@@ -0,0 +1,146 @@
+#
+# Copyright (C) 2022  CZ.NIC, z. s. p. o.
+#
+# This file is part of FRED.
+#
+# FRED is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# FRED is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with FRED.  If not, see <https://www.gnu.org/licenses/>.
+"""Process-wide logger shared by threads, which survives forks."""
+from __future__ import unicode_literals
+
+import os
+import threading
+import weakref
+
+from .corbalogger import LoggerFailSilent
+
+__all__ = ["DaoPool", "SharedLogger", "configure", "get_logger"]
+
+# Shared loggers of this process, which are reset after fork.
+_shared_loggers = weakref.WeakSet()
+
+
+def _after_fork():
+    for shared_logger in list(_shared_loggers):
+        shared_logger._after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+class DaoPool(object):
+    """Pool of Data Access Objects, which are used in turns.
+
+    Each call picks the next DAO from the pool, so calls are spread over several object references,
+    possibly of several logger backend replicas.
+    """
+
+    def __init__(self, dao_factories, size=1):
+        """Init DaoPool.
+
+        Arguments:
+            dao_factories: Callable or list of callables, which return a new DAO, e.g. one for each backend replica.
+            size: Number of DAOs in the pool. DAOs are created by the factories in turns.
+        """
+        if callable(dao_factories):
+            dao_factories = [dao_factories]
+        self.dao_factories = list(dao_factories)
+        self.size = max(size, len(self.dao_factories))
+        self._lock = threading.Lock()
+        self._daos = [self.dao_factories[index % len(self.dao_factories)]() for index in range(self.size)]
+        self._index = 0
+
+    def __getattr__(self, name):
+        return getattr(self.next_dao(), name)
+
+    def next_dao(self):
+        """Return the next DAO from the pool."""
+        with self._lock:
+            dao = self._daos[self._index]
+            self._index = (self._index + 1) % self.size
+        return dao
+
+
+class SharedLogger(object):
+    """Lazily created logger shared by all threads of a process.
+
+    The logger is created on first use. After a fork, the child creates new DAOs, since the object references
+    of the parent can't be used, but keeps the type codes loaded by the parent and restarts their refresher.
+    Locks of the logger, which may have been held by other threads of the parent, are replaced.
+
+    Example:
+        shared_logger = SharedLogger(get_corba_logger, pool_size=4)
+        ...
+        logger = shared_logger.get_logger()
+        req = logger.create_request("127.0.0.1", "EPP", "DomainCreate", props)
+    """
+
+    def __init__(self, dao_factories, pool_size=1, logger_class=LoggerFailSilent, **kwargs):
+        """Init SharedLogger.
+
+        Arguments:
+            dao_factories: Callable or list of callables, which return a new DAO.
+            pool_size: Number of DAOs in the pool.
+            logger_class: Class of the logger.
+            kwargs: Other arguments passed to the logger.
+        """
+        self.dao_factories = dao_factories
+        self.pool_size = pool_size
+        self.logger_class = logger_class
+        self.logger_kwargs = kwargs
+        self._logger = None
+        self._pid = None
+        self._lock = threading.Lock()
+        _shared_loggers.add(self)
+
+    def get_logger(self):
+        """Return the logger of this process."""
+        if self._logger is None or self._pid != os.getpid():
+            with self._lock:
+                if self._logger is None:
+                    self._logger = self.logger_class(self._create_pool(), **self.logger_kwargs)
+                elif self._pid != os.getpid():
+                    self._logger.dao = self._create_pool()
+                    if not hasattr(os, 'register_at_fork'):
+                        self._logger._after_fork()
+                self._pid = os.getpid()
+        return self._logger
+
+    def _create_pool(self):
+        return DaoPool(self.dao_factories, self.pool_size)
+
+    def _after_fork(self):
+        # The lock may have been held by another thread of the parent.
+        self._lock = threading.Lock()
+        if self._logger is not None:
+            self._logger._after_fork()
+
+
+_shared_logger = None
+
+
+def configure(dao_factories, pool_size=1, logger_class=LoggerFailSilent, **kwargs):
+    """Configure the process-wide shared logger.
+
+    Arguments are passed to SharedLogger.
+    """
+    global _shared_logger
+    _shared_logger = SharedLogger(dao_factories, pool_size=pool_size, logger_class=logger_class, **kwargs)
+
+
+def get_logger():
+    """Return the process-wide shared logger."""
+    if _shared_logger is None:
+        raise RuntimeError("Shared logger is not configured.")
+    return _shared_logger.get_logger()
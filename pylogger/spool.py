@@ -0,0 +1,406 @@
+#
+# Copyright (C) 2022  CZ.NIC, z. s. p. o.
+#
+# This file is part of FRED.
+#
+# FRED is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# FRED is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with FRED.  If not, see <https://www.gnu.org/licenses/>.
+"""Local spool of requests, which could not be sent to the server."""
+from __future__ import unicode_literals
+
+import fcntl
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+
+from pyfco import u2c
+
+from .conversion import decode_properties, decode_references, encode_properties, encode_references
+from .corbalogger import ConditionalLogRequest, DeferredLogRequest, Logger, LoggingException, LogRequest
+
+__all__ = ["Spool", "SpoolConditionalLogRequest", "SpoolDeferredLogRequest", "SpoolingLogger", "SpoolLockedError",
+           "SpoolLogRequest", "SpoolReplayer", "take_over_spools"]
+
+LOGGER = logging.getLogger(__name__)
+
+# Spooled operations.
+CREATE = 'create'
+CLOSE = 'close'
+# Mapping of local request id to the request id from the server.
+MAP = 'map'
+
+
+class SpoolLockedError(LoggingException):
+    """Spool directory is used by another process."""
+
+
+class Spool(object):
+    """Append-only spool of operations stored in segment files.
+
+    Each segment contains one JSON record per line. Segment is rotated once it exceeds `segment_size` bytes.
+    Records are synced to the disk after every `fsync_every` records and on `sync`.
+    The spool directory is locked until the spool is closed or its process dies, so it can't be shared
+    by several processes. Spools left by dead processes can be taken over by `take_over_spools`.
+    """
+
+    SEGMENT_PATTERN = re.compile(r'^segment-(\d+)\.log$')
+    LOCK_NAME = '.lock'
+
+    def __init__(self, directory, segment_size=64 * 1024 * 1024, fsync_every=100):
+        """Init Spool.
+
+        Arguments:
+            directory: Directory with the segment files.
+            segment_size: Size of a segment in bytes, after which a new segment is started.
+            fsync_every: Number of records after which the segment is synced to the disk.
+        """
+        self.directory = directory
+        self.segment_size = segment_size
+        self.fsync_every = fsync_every
+        self._lock_file = open(os.path.join(directory, self.LOCK_NAME), 'a')
+        try:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except (IOError, OSError) as error:
+            self._lock_file.close()
+            raise SpoolLockedError("Spool directory %s is locked: %s." % (directory, error))
+        self._lock = threading.Lock()
+        self._file = None
+        self._unsynced = 0
+        self._last_local_id = 0
+        numbers = [number for number, _ in self._segments()]
+        self._number = max(numbers) if numbers else 0
+
+    def new_local_id(self):
+        """Return a new local request id.
+
+        Local ids are negative, so they can't be mistaken for request ids from the server.
+        """
+        with self._lock:
+            self._last_local_id = min(self._last_local_id - 1, -int(time.time() * 1000000))
+            return self._last_local_id
+
+    def append(self, record):
+        """Append the record to the current segment."""
+        line = (json.dumps(record) + '\n').encode('utf-8')
+        with self._lock:
+            if self._file is None:
+                self._number += 1
+                self._file = open(self._path(self._number), 'ab')
+            self._file.write(line)
+            self._unsynced += 1
+            if self._unsynced >= self.fsync_every:
+                self._sync()
+            if self._file.tell() >= self.segment_size:
+                self._close_segment()
+
+    def sync(self):
+        """Write all records to the disk."""
+        with self._lock:
+            if self._file is not None:
+                self._sync()
+
+    def rotate(self):
+        """Close the current segment, next records are written to a new one."""
+        with self._lock:
+            if self._file is not None:
+                self._close_segment()
+
+    def close(self):
+        """Close the current segment and unlock the spool directory."""
+        with self._lock:
+            if self._file is not None:
+                self._close_segment()
+            if not self._lock_file.closed:
+                self._lock_file.close()
+
+    def closed_segments(self):
+        """Return paths of segments, which are no longer written to, from the oldest."""
+        with self._lock:
+            current = self._number if self._file is not None else None
+            return [path for number, path in self._segments() if number != current]
+
+    def _segments(self):
+        segments = []
+        for name in os.listdir(self.directory):
+            match = self.SEGMENT_PATTERN.match(name)
+            if match:
+                segments.append((int(match.group(1)), os.path.join(self.directory, name)))
+        return sorted(segments)
+
+    def _path(self, number):
+        return os.path.join(self.directory, 'segment-%012d.log' % number)
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+    def _close_segment(self):
+        self._sync()
+        self._file.close()
+        self._file = None
+
+
+def take_over_spools(root, **kwargs):
+    """Return spools in the subdirectories of the root, which are not used by any live process.
+
+    Returned spools are locked, so they should be replayed and closed afterwards.
+
+    Arguments:
+        root: Directory with spool directories, e.g. one per worker process.
+        kwargs: Other arguments passed to Spool.
+    """
+    spools = []
+    for name in sorted(os.listdir(root)):
+        directory = os.path.join(root, name)
+        if not os.path.isdir(directory):
+            continue
+        try:
+            spools.append(Spool(directory, **kwargs))
+        except SpoolLockedError:
+            continue
+    return spools
+
+
+class SpoolingLogger(Logger):
+    """Logger which spools requests to the disk, if they can't be sent to the server.
+
+    Requests, which failed to be created, get a negative local request id. Their close is spooled as well.
+    Spooled operations are sent to the server by SpoolReplayer, which preserves their order.
+
+    Each process needs its own spool directory. Use a stable name per worker, so a restarted worker replays
+    the spool of its predecessor, or take over spools of dead processes with `take_over_spools`.
+
+    Example:
+        spool = Spool('/var/spool/fred-pylogger/worker-%d' % worker_number)
+        logger = SpoolingLogger(dao, spool)
+        replayer = SpoolReplayer(spool, dao)
+        replayer.start(interval=30)
+
+    Example of a replay of spools left by dead processes:
+        for spool in take_over_spools('/var/spool/fred-pylogger'):
+            SpoolReplayer(spool, dao).replay()
+            spool.close()
+    """
+
+    def __init__(self, dao, spool, defer=False, **kwargs):
+        """Init SpoolingLogger.
+
+        Arguments:
+            dao: Data Access Object for the logger.
+            spool: Spool for the operations.
+            defer: If True, all operations are spooled without contacting the server.
+            kwargs: Other arguments passed to Logger.
+        """
+        Logger.__init__(self, dao, **kwargs)
+        self.spool = spool
+        self.defer = defer
+
+    def create_request(self, source_ip, service_name, request_type_name,
+                       properties=None, references=None, session_id=None,
+                       default_result=None, content='', deferred=False):
+        """Create a request object on the server or in the spool.
+
+        If deferred, the request is created only when it's closed or its request_id is read.
+        Returns a new SpoolLogRequest object.
+        """
+        default_result = self._get_default_result(service_name, default_result)
+        create_args = (source_ip, content, service_name, request_type_name, properties, references, session_id)
+        if self.policies:
+            sampled_request = self._sample_request(service_name, request_type_name, default_result, create_args)
+            if sampled_request is not None:
+                return sampled_request
+        if deferred:
+            # Fail on unknown codes right away, not on close.
+            self._get_request_type_code(service_name, request_type_name)
+            return SpoolDeferredLogRequest(self, create_args, service_name, request_type_name, default_result)
+        request_id = self._server_create_request(
+            source_ip, content, service_name, request_type_name, properties, references, session_id)
+        return SpoolLogRequest(self, request_id, service_name, request_type_name, default_result)
+
+    def template(self, *args, **kwargs):
+        """Return a factory of requests of the service and request type, which are spooled on failure."""
+        request_template = Logger.template(self, *args, **kwargs)
+        request_template.request_class = SpoolLogRequest
+        return request_template
+
+    def _conditional_request(self, policy, create_args, service_name, request_type_name, default_result,
+                             fail_silent):
+        return SpoolConditionalLogRequest(self, policy, create_args, service_name, request_type_name, default_result,
+                                          fail_silent=fail_silent)
+
+    def _send_create_request(self, service_name, request_type_name, source_ip, content, service_code,
+                             request_type_code, converted_properties, converted_references, session_id):
+        if not self.defer:
+            try:
+                request_id = Logger._send_create_request(
+                    self, service_name, request_type_name, source_ip, content, service_code, request_type_code,
+                    converted_properties, converted_references, session_id)
+                if request_id != 0:
+                    return request_id
+                LOGGER.warning('Logger failed to create request, spooling it.')
+            except Exception as error:
+                LOGGER.warning('Logger failed to create request, spooling it: %s.', error)
+        request_id = self.spool.new_local_id()
+        self.spool.append({'op': CREATE, 'request_id': request_id, 'source_ip': source_ip,
+                           'service_code': service_code, 'request_type_code': request_type_code,
+                           'content': content, 'properties': encode_properties(converted_properties),
+                           'references': encode_references(converted_references), 'session_id': session_id})
+        return request_id
+
+
+class SpoolLogRequest(LogRequest):
+    """LogRequest which is closed in the spool, if it can't be closed on the server."""
+
+    __slots__ = ()
+
+    def _send_close_request(self, content, converted_properties, converted_references, result_code, session_id):
+        if self.request_id > 0 and not self.logger.defer:
+            try:
+                return LogRequest._send_close_request(
+                    self, content, converted_properties, converted_references, result_code, session_id)
+            except Exception as error:
+                LOGGER.warning('Logger failed to close request %s, spooling it: %s.', self.request_id, error)
+        self.logger.spool.append({'op': CLOSE, 'request_id': self.request_id, 'content': content,
+                                  'properties': encode_properties(converted_properties),
+                                  'references': encode_references(converted_references),
+                                  'result_code': result_code, 'session_id': session_id})
+
+
+class SpoolDeferredLogRequest(DeferredLogRequest, SpoolLogRequest):
+    """DeferredLogRequest which is closed in the spool, if it can't be closed on the server."""
+
+    __slots__ = ()
+
+
+class SpoolConditionalLogRequest(ConditionalLogRequest, SpoolLogRequest):
+    """ConditionalLogRequest which is closed in the spool, if it can't be closed on the server."""
+
+    __slots__ = ()
+
+
+class SpoolReplayer(object):
+    """Replayer of spooled operations to the server.
+
+    Operations are replayed in order of the spool. Local request ids of spooled requests are replaced
+    by the request ids from the server. Replayed segments are removed, failed segment is kept from the failed
+    operation on and replayed next time. Operations are replayed at least once, an operation may be repeated,
+    if the process is killed during the replay.
+    """
+
+    def __init__(self, spool, dao):
+        """Init SpoolReplayer.
+
+        Arguments:
+            spool: Spool to be replayed.
+            dao: Data Access Object of the logger.
+        """
+        self.spool = spool
+        self.dao = dao
+        # Local request id -> request id from the server, for requests which are not closed yet.
+        self.id_map = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def replay(self):
+        """Replay all spooled operations.
+
+        Returns True if all operations were replayed, False if replay failed.
+        """
+        self.spool.rotate()
+        for path in self.spool.closed_segments():
+            records = self._read(path)
+            for index, record in enumerate(records):
+                try:
+                    self._replay_record(record)
+                except Exception as error:
+                    LOGGER.warning('Logger failed to replay spooled %s: %s.', record.get('op'), error)
+                    self._rewrite(path, self._map_records() + records[index:])
+                    return False
+            os.unlink(path)
+        # Keep the mapping for requests, which will be closed later.
+        for record in self._map_records():
+            self.spool.append(record)
+        self.spool.sync()
+        return True
+
+    def start(self, interval=30):
+        """Start a thread, which replays the spool every `interval` seconds."""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval, ), name='pylogger-spool-replayer')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """Stop the replaying thread."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.replay()
+            except Exception as error:
+                LOGGER.error('Logger failed to error during spool replay: %s.', error)
+
+    def _read(self, path):
+        records = []
+        with open(path, 'rb') as segment:
+            for line in segment:
+                try:
+                    records.append(json.loads(line.decode('utf-8')))
+                except ValueError:
+                    # Incomplete record, written just before a crash.
+                    LOGGER.warning('Invalid record in spool segment %s skipped.', path)
+        return records
+
+    def _rewrite(self, path, records):
+        handle, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.pylogger-')
+        with os.fdopen(handle, 'wb') as segment:
+            for record in records:
+                segment.write((json.dumps(record) + '\n').encode('utf-8'))
+            segment.flush()
+            os.fsync(segment.fileno())
+        os.rename(tmp_path, path)
+
+    def _map_records(self):
+        return [{'op': MAP, 'request_id': local_id, 'server_request_id': request_id}
+                for local_id, request_id in sorted(self.id_map.items())]
+
+    def _replay_record(self, record):
+        if record['op'] == MAP:
+            self.id_map[record['request_id']] = record['server_request_id']
+        elif record['op'] == CREATE:
+            request_id = self.dao.createRequest(
+                record['source_ip'], record['service_code'], u2c(record['content']),
+                decode_properties(record['properties']), decode_references(record['references']),
+                record['request_type_code'], record['session_id'])
+            if request_id == 0:
+                raise LoggingException("Failed to create spooled request %s." % record['request_id'])
+            self.id_map[record['request_id']] = request_id
+        else:
+            request_id = record['request_id']
+            if request_id < 0:
+                if request_id not in self.id_map:
+                    LOGGER.error('Spooled request %s was never created, dropping its close.', request_id)
+                    return
+                request_id = self.id_map[request_id]
+            self.dao.closeRequest(
+                request_id, u2c(record['content']), decode_properties(record['properties']),
+                decode_references(record['references']), record['result_code'], record['session_id'])
+            self.id_map.pop(record['request_id'], None)
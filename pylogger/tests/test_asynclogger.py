@@ -0,0 +1,150 @@
+#
+# Copyright (C) 2022  CZ.NIC, z. s. p. o.
+#
+# This file is part of FRED.
+#
+# FRED is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# FRED is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with FRED.  If not, see <https://www.gnu.org/licenses/>.
+"""Tests of AsyncLogger."""
+import asyncio
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from pylogger.asynclogger import AsyncLogger
+from pylogger.corbalogger import Logger
+from pylogger.fakedao import FakeDao, FakeDaoError
+
+
+class ResultFakeDao(FakeDao):
+    """FakeDao, which records result codes of closed requests."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.result_codes = {}
+
+    def closeRequest(self, request_id, content, properties, references, result_code, session_id):
+        super().closeRequest(request_id, content, properties, references, result_code, session_id)
+        self.result_codes[request_id] = result_code
+
+
+class ConcurrencyLogger(object):
+    """Logger stub, which records the maximal number of concurrent calls."""
+
+    def __init__(self):
+        self.running = 0
+        self.max_running = 0
+        self._lock = threading.Lock()
+
+    def start_session(self, user_id, username):
+        with self._lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(0.05)
+        with self._lock:
+            self.running -= 1
+        return user_id
+
+
+class AsyncLoggerTest(unittest.TestCase):
+    def test_semaphore(self):
+        executor = ThreadPoolExecutor(8)
+        self.addCleanup(executor.shutdown)
+        logger = AsyncLogger(ConcurrencyLogger(), executor=executor, max_concurrency=2)
+        # The semaphore is not created outside of the event loop.
+        self.assertIsNone(logger._semaphore)
+
+        async def run():
+            return await asyncio.gather(*(logger.start_session(number, 'user') for number in range(6)))
+
+        self.assertEqual(asyncio.run(run()), list(range(6)))
+        self.assertIsNotNone(logger._semaphore)
+        self.assertEqual(logger.logger.max_running, 2)
+
+    def test_create_and_close(self):
+        dao = ResultFakeDao()
+
+        async def run():
+            logger = await AsyncLogger.create(dao)
+            request = await logger.create_request('127.0.0.1', 'EPP', 'DomainInfo', [['handle', 'example.cz']])
+            await request.close(result='Success')
+            logger.close()
+            return request
+
+        request = asyncio.run(run())
+        self.assertEqual(dao.requests, {request.request_id: 'closed'})
+        self.assertEqual(dao.result_codes, {request.request_id: 1001})
+
+    def test_fail_silent(self):
+        dao = FakeDao(failure_rate=1, fail_methods=['createRequest', 'closeRequest'])
+
+        async def run():
+            logger = await AsyncLogger.create(dao)
+            request = await logger.create_request('127.0.0.1', 'EPP', 'DomainInfo')
+            await request.close(result='Success')
+            logger.close()
+            return request
+
+        # The failures are only logged.
+        with self.assertLogs('pylogger', 'ERROR'):
+            request = asyncio.run(run())
+        self.assertEqual(request.request_id, 0)
+        self.assertEqual(dao.calls['createRequest'], 1)
+
+    def test_not_fail_silent(self):
+        dao = FakeDao(failure_rate=1, fail_methods=['closeRequest'])
+
+        async def run():
+            logger = await AsyncLogger.create(dao, logger_class=Logger)
+            try:
+                request = await logger.create_request('127.0.0.1', 'EPP', 'DomainInfo')
+                await request.close(result='Success')
+            finally:
+                logger.close()
+
+        with self.assertRaises(FakeDaoError):
+            asyncio.run(run())
+
+    def test_context_manager(self):
+        dao = ResultFakeDao()
+
+        async def run():
+            logger = await AsyncLogger.create(dao)
+            async with await logger.create_request('127.0.0.1', 'EPP', 'DomainInfo') as request:
+                request.result = 'Success'
+            logger.close()
+            return request
+
+        request = asyncio.run(run())
+        self.assertEqual(dao.result_codes, {request.request_id: 1001})
+
+    def test_context_manager_exception(self):
+        dao = ResultFakeDao()
+
+        async def run(requests):
+            logger = await AsyncLogger.create(dao)
+            try:
+                async with await logger.create_request('127.0.0.1', 'EPP', 'DomainInfo',
+                                                       default_result='Error') as request:
+                    requests.append(request)
+                    request.result = 'Success'
+                    raise ValueError('Gazpacho!')
+            finally:
+                logger.close()
+
+        requests = []
+        with self.assertRaises(ValueError):
+            asyncio.run(run(requests))
+        # The default result overrides the result set before the exception.
+        self.assertEqual(dao.result_codes, {requests[0].request_id: 1002})
@@ -0,0 +1,83 @@
+#
+# Copyright (C) 2022  CZ.NIC, z. s. p. o.
+#
+# This file is part of FRED.
+#
+# FRED is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# FRED is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with FRED.  If not, see <https://www.gnu.org/licenses/>.
+"""Tests of BackgroundLogger."""
+from __future__ import unicode_literals
+
+import time
+import unittest
+
+from pylogger.background import BackgroundLogger
+from pylogger.corbalogger import LoggingException
+from pylogger.fakedao import FakeDao
+
+
+class BackgroundLoggerTest(unittest.TestCase):
+    def test_create_and_close(self):
+        dao = FakeDao()
+        logger = BackgroundLogger(dao)
+        requests = [logger.create_request('127.0.0.1', 'EPP', 'DomainInfo') for _ in range(10)]
+        for request in requests:
+            request.close(result='Success')
+        self.assertTrue(logger.flush(timeout=5))
+        logger.shutdown()
+        self.assertEqual(dao.requests, dict((request.request_id, 'closed') for request in requests))
+
+    def test_request_id_timeout(self):
+        logger = BackgroundLogger(FakeDao(), workers=0, request_id_timeout=0.01)
+        request = logger.create_request('127.0.0.1', 'EPP', 'DomainInfo')
+        with self.assertRaises(LoggingException):
+            request.request_id
+        logger.shutdown()
+
+    def test_template(self):
+        dao = FakeDao(latency=0.2)
+        logger = BackgroundLogger(dao)
+        template = logger.template('EPP', 'DomainInfo', static_properties=[['server', 'epp1']])
+        start = time.time()
+        request = template('127.0.0.1', [['handle', 'example.cz']])
+        request.close(result='Success')
+        # Neither create nor close waits for the server.
+        self.assertLess(time.time() - start, 0.2)
+        self.assertTrue(logger.flush(timeout=5))
+        logger.shutdown()
+        self.assertEqual(dao.requests, {request.request_id: 'closed'})
+
+    def test_deferred(self):
+        dao = FakeDao()
+        logger = BackgroundLogger(dao)
+        closed = logger.create_request('127.0.0.1', 'EPP', 'DomainInfo', deferred=True)
+        read = logger.create_request('127.0.0.1', 'EPP', 'DomainInfo', deferred=True)
+        self.assertTrue(logger.flush(timeout=5))
+        self.assertEqual(dao.calls['createRequest'], 0)
+        self.assertNotEqual(read.request_id, 0)
+        closed.close(result='Success')
+        self.assertTrue(logger.flush(timeout=5))
+        logger.shutdown()
+        self.assertEqual(dao.requests, {read.request_id: 'open', closed.request_id: 'closed'})
+
+    def test_deferred_unknown_request_type(self):
+        logger = BackgroundLogger(FakeDao(), workers=0)
+        with self.assertRaises(ValueError):
+            logger.create_request('127.0.0.1', 'EPP', 'Unknown', deferred=True)
+        logger.shutdown()
+
+    def test_no_dict(self):
+        logger = BackgroundLogger(FakeDao(), workers=0)
+        request = logger.create_request('127.0.0.1', 'EPP', 'DomainInfo')
+        self.assertFalse(hasattr(request, '__dict__'))
+        logger.shutdown()
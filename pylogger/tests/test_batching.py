@@ -0,0 +1,150 @@
+#
+# Copyright (C) 2022  CZ.NIC, z. s. p. o.
+#
+# This file is part of FRED.
+#
+# FRED is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# FRED is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with FRED.  If not, see <https://www.gnu.org/licenses/>.
+"""Tests of BatchingDao."""
+from __future__ import unicode_literals
+
+import threading
+import time
+import unittest
+
+from pylogger.batching import BatchingDao, BatchTimeoutError
+from pylogger.fakedao import FakeDao
+
+CREATE_ARGS = ('127.0.0.1', 1, '', [], [], 1001, 0)
+
+
+class BulkFakeDao(FakeDao):
+    """FakeDao with bulk methods, which may return fewer results than calls."""
+
+    def __init__(self, missing=0, **kwargs):
+        super(BulkFakeDao, self).__init__(**kwargs)
+        self.missing = missing
+        self.batches = []
+        # Names of methods in order of their calls.
+        self.order = []
+
+    def createRequests(self, calls):
+        self.batches.append(len(calls))
+        results = [self.createRequest(*args) for args in calls]
+        return results[:len(results) - self.missing]
+
+    def closeRequests(self, calls):
+        self.order.append('closeRequests')
+        for args in calls:
+            self.closeRequest(*args)
+
+    def closeSession(self, session_id):
+        self.order.append('closeSession')
+        super(BulkFakeDao, self).closeSession(session_id)
+
+
+def _run_threads(target, count):
+    """Run the target in count threads and return their results or errors in order."""
+    results = [None] * count
+
+    def run(index):
+        try:
+            results[index] = target()
+        except Exception as error:
+            results[index] = error
+
+    threads = [threading.Thread(target=run, args=(index, )) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+        if thread.is_alive():
+            raise AssertionError("Thread hangs.")
+    return results
+
+
+class BatchingDaoTest(unittest.TestCase):
+    def setUp(self):
+        self.dao = None
+
+    def tearDown(self):
+        if self.dao is not None:
+            self.dao.close(5)
+
+    def test_single_create(self):
+        self.dao = BatchingDao(BulkFakeDao(), max_size=100, max_delay=0.01, timeout=5)
+        self.assertEqual(self.dao.createRequest(*CREATE_ARGS), 1)
+
+    def test_without_bulk_methods(self):
+        fake_dao = FakeDao(latency=0.05)
+        self.dao = BatchingDao(fake_dao, max_size=100, max_delay=10, timeout=5)
+        start = time.time()
+        request_ids = _run_threads(lambda: self.dao.createRequest(*CREATE_ARGS), 10)
+        for request_id in request_ids:
+            self.dao.closeRequest(request_id, '', [], [], 1, 0)
+        # Calls are neither delayed nor serialized.
+        self.assertLess(time.time() - start, 5)
+        self.assertEqual(set(fake_dao.requests.values()), {'closed'})
+
+    def test_close_session_after_closes(self):
+        fake_dao = BulkFakeDao()
+        self.dao = BatchingDao(fake_dao, max_size=100, max_delay=10, timeout=5)
+        session_id = fake_dao.createSession(1, 'user')
+        request_id = fake_dao.createRequest(*CREATE_ARGS)
+        self.dao.closeRequest(request_id, '', [], [], 1, session_id)
+        self.dao.closeSession(session_id)
+        self.assertEqual(fake_dao.order, ['closeRequests', 'closeSession'])
+
+    def test_concurrent_creates(self):
+        fake_dao = BulkFakeDao()
+        self.dao = BatchingDao(fake_dao, max_size=10, max_delay=0.01, timeout=5)
+        results = _run_threads(lambda: self.dao.createRequest(*CREATE_ARGS), 25)
+        self.assertEqual(sorted(results), list(range(1, 26)))
+        self.assertEqual(fake_dao.calls['createRequest'], 25)
+
+    def test_bulk_creates(self):
+        fake_dao = BulkFakeDao()
+        self.dao = BatchingDao(fake_dao, max_size=10, max_delay=0.05, timeout=5)
+        results = _run_threads(lambda: self.dao.createRequest(*CREATE_ARGS), 10)
+        self.assertEqual(sorted(results), list(range(1, 11)))
+        self.assertLess(len(fake_dao.batches), 10)
+
+    def test_bulk_missing_results(self):
+        self.dao = BatchingDao(BulkFakeDao(missing=2), max_size=3, max_delay=1, timeout=5)
+        results = _run_threads(lambda: self.dao.createRequest(*CREATE_ARGS), 3)
+        self.assertEqual(len([r for r in results if isinstance(r, RuntimeError)]), 2)
+        self.assertEqual(len([r for r in results if isinstance(r, int)]), 1)
+
+    def test_create_error(self):
+        self.dao = BatchingDao(BulkFakeDao(failure_rate=1), max_delay=0.01, timeout=5)
+        results = _run_threads(lambda: self.dao.createRequest(*CREATE_ARGS), 3)
+        self.assertEqual([type(r).__name__ for r in results], ['FakeDaoError'] * 3)
+
+    def test_create_timeout(self):
+        fake_dao = BulkFakeDao(latency=0.5)
+        self.dao = BatchingDao(fake_dao, max_size=1, max_delay=0, timeout=0.1)
+        results = _run_threads(lambda: self.dao.createRequest(*CREATE_ARGS), 3)
+        self.assertTrue(all(isinstance(r, BatchTimeoutError) for r in results))
+        self.dao.flush(5)
+        # Calls, which weren't sent before the timeout, are dropped.
+        self.assertLess(fake_dao.calls['createRequest'], 3)
+
+    def test_closes_flushed(self):
+        fake_dao = BulkFakeDao()
+        self.dao = BatchingDao(fake_dao, max_size=100, max_delay=10)
+        request_ids = [fake_dao.createRequest(*CREATE_ARGS) for _ in range(5)]
+        _run_threads(lambda: self.dao.closeRequest(request_ids.pop(), '', [], [], 1, 0), 5)
+        start = time.time()
+        self.assertTrue(self.dao.flush(5))
+        self.assertLess(time.time() - start, 5)
+        self.assertEqual(set(fake_dao.requests.values()), {'closed'})
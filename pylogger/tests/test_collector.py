@@ -0,0 +1,117 @@
+#
+# Copyright (C) 2022  CZ.NIC, z. s. p. o.
+#
+# This file is part of FRED.
+#
+# FRED is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# FRED is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with FRED.  If not, see <https://www.gnu.org/licenses/>.
+"""Tests of Collector and CollectorDao."""
+from __future__ import unicode_literals
+
+import io
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+from fred_idl import ccReg
+
+from pylogger.collector import CALL, FRAME_HEADER, Collector, CollectorDao, CollectorError, _read_frame
+from pylogger.corbalogger import Logger
+from pylogger.fakedao import FakeDao
+
+
+class RecordingFakeDao(FakeDao):
+    """FakeDao, which records arguments of created requests."""
+
+    def __init__(self, **kwargs):
+        super(RecordingFakeDao, self).__init__(**kwargs)
+        self.created = []
+
+    def createRequest(self, *args):
+        self.created.append(args)
+        return super(RecordingFakeDao, self).createRequest(*args)
+
+
+class FrameTest(unittest.TestCase):
+    def test_read_frame(self):
+        data = b'["getServices", []]'
+        frame = _read_frame(io.BytesIO(FRAME_HEADER.pack(len(data), CALL, 7) + data))
+        self.assertEqual(frame, (CALL, 7, ['getServices', []]))
+
+    def test_end_of_file(self):
+        self.assertIsNone(_read_frame(io.BytesIO(b'')))
+
+    def test_truncated(self):
+        with self.assertRaises(EOFError):
+            _read_frame(io.BytesIO(FRAME_HEADER.pack(10, CALL, 1)[:5]))
+        with self.assertRaises(EOFError):
+            _read_frame(io.BytesIO(FRAME_HEADER.pack(10, CALL, 1) + b'[]'))
+
+    def test_too_large(self):
+        with self.assertRaises(ValueError):
+            _read_frame(io.BytesIO(struct.pack('!IBI', 2 ** 32 - 1, CALL, 1)))
+
+
+class CollectorTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'collector.sock')
+        self.dao = RecordingFakeDao()
+        self.collector = Collector(self.dao, self.path)
+        self.collector.start()
+        self.collector_dao = CollectorDao(self.path, timeout=5)
+
+    def tearDown(self):
+        self.collector_dao.close()
+        self.collector.shutdown(5)
+        shutil.rmtree(self.tmp_dir)
+
+    def test_round_trip(self):
+        logger = Logger(self.collector_dao)
+        session_id = logger.start_session(1, 'user')
+        request = logger.create_request('127.0.0.1', 'EPP', 'DomainInfo', properties=[['handle', 'example.cz']],
+                                        references=[['domain', 42]], session_id=session_id)
+        request.close(result='Success')
+        logger.close_session(session_id)
+        # Calls without a result are handled in order, so they are done once the next call returns.
+        logger.start_session(2, 'other')
+        self.assertEqual(self.dao.requests, {request.request_id: 'closed'})
+        self.assertEqual(self.dao.sessions[session_id], 'closed')
+        args = self.dao.created[0]
+        self.assertEqual([(p.name, p.value, p.child) for p in args[3]], [('handle', 'example.cz', False)])
+        self.assertIsInstance(args[3][0], ccReg.RequestProperty)
+        self.assertEqual([(r.type, r.id) for r in args[4]], [('domain', 42)])
+
+    def test_type_codes_cached(self):
+        Logger(self.collector_dao)
+        other_dao = CollectorDao(self.path, timeout=5)
+        self.addCleanup(other_dao.close)
+        logger = Logger(other_dao)
+        self.assertEqual(self.dao.calls['getServices'], 1)
+        self.assertEqual(logger.request_type_codes['EPP']['DomainInfo'], (1, 1002))
+
+    def test_error(self):
+        logger = Logger(self.collector_dao)
+        self.dao.failure_rate = 1
+        with self.assertRaises(CollectorError):
+            self.collector_dao.createRequest('127.0.0.1', 1, '', [], [], 1002, 0)
+        # Error of a call without a result is only logged by the collector.
+        self.collector_dao.closeRequest(1, '', [], [], 1001, 0)
+        self.dao.failure_rate = 0
+        self.assertNotEqual(logger.create_request('127.0.0.1', 'EPP', 'DomainInfo').request_id, 0)
+
+    def test_unknown_method(self):
+        with self.assertRaises(CollectorError):
+            self.collector_dao._call('dropDatabase', ())
@@ -0,0 +1,92 @@
+#
+# Copyright (C) 2022  CZ.NIC, z. s. p. o.
+#
+# This file is part of FRED.
+#
+# FRED is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# FRED is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with FRED.  If not, see <https://www.gnu.org/licenses/>.
+"""Tests of PropertyConverter."""
+from __future__ import unicode_literals
+
+import datetime
+import unittest
+
+import six
+from fred_idl import ccReg
+from pyfco import u2c
+
+from pylogger.conversion import PropertyConverter
+
+
+def _legacy_convert_nested_to_str(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if not isinstance(value, list) and not isinstance(value, tuple):
+        return six.text_type(value)
+    return [_legacy_convert_nested_to_str(item) for item in value]
+
+
+def _legacy_convert_properties(properties):
+    """Convert properties the way Logger.convert_properties did before PropertyConverter."""
+    converted_properties = []
+    for prop in properties or ():
+        name, value = prop[0], prop[1]
+        child = prop[2] if len(prop) > 2 else False
+        if not isinstance(name, six.string_types):
+            name = six.text_type(name)
+        if not isinstance(value, six.string_types):
+            value = six.text_type(_legacy_convert_nested_to_str(value))
+        converted_properties.append(ccReg.RequestProperty(u2c(name), u2c(value), child))
+    return converted_properties
+
+
+def _as_tuples(converted_properties):
+    return [(prop.name, prop.value, prop.child) for prop in converted_properties]
+
+
+class PropertyConverterTest(unittest.TestCase):
+    def assertLegacyOutput(self, properties):
+        legacy = _as_tuples(_legacy_convert_properties(properties))
+        converter = PropertyConverter()
+        self.assertEqual(_as_tuples(converter.convert_properties(properties)), legacy)
+        # Second conversion uses the cached names and value converters.
+        self.assertEqual(_as_tuples(converter.convert_properties(properties)), legacy)
+        self.assertEqual(_as_tuples(converter.convert_property(*prop) for prop in properties), legacy)
+
+    def test_strings(self):
+        self.assertLegacyOutput([['handle', 'example.cz'], ['name', 'Příliš žluťoučký kůň', True]])
+
+    def test_child_default(self):
+        properties = [['handle', 'example.cz']]
+        self.assertLegacyOutput(properties)
+        self.assertIs(PropertyConverter().convert_properties(properties)[0].child, False)
+
+    def test_dates(self):
+        self.assertLegacyOutput([['crDate', datetime.date(2022, 1, 12)],
+                                 ['upDate', datetime.datetime(2022, 1, 12, 10, 30, 15)]])
+
+    def test_nested(self):
+        self.assertLegacyOutput([
+            ['add.ns.addr', ['192.0.2.1', '2001:db8::1'], True],
+            ['add.tech', ('CID-TECH1', 'CID-TECH2')],
+            ['rem.ns', [['ns-old.example.cz', ('198.51.100.1', 5)]]],
+            ['dates', [datetime.date(2022, 1, 12), (datetime.datetime(2022, 1, 12, 10, 30), None)]],
+            ['empty', []],
+        ])
+
+    def test_other_values(self):
+        self.assertLegacyOutput([['reportLevel', 5], ['ratio', 0.5], ['flag', False], ['none', None],
+                                 ['bytes', b'example.cz']])
+
+    def test_names(self):
+        self.assertLegacyOutput([[5, 'number'], [b'bytes', 'value'], [None, 'none'], ['text', 'value']])
@@ -0,0 +1,292 @@
+#
+# Copyright (C) 2022  CZ.NIC, z. s. p. o.
+#
+# This file is part of FRED.
+#
+# FRED is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# FRED is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with FRED.  If not, see <https://www.gnu.org/licenses/>.
+"""Tests of Logger and LoggerFailSilent."""
+from __future__ import unicode_literals
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from pylogger import breaker
+from pylogger.breaker import CircuitBreaker
+from pylogger.corbalogger import Logger, LoggerFailSilent
+from pylogger.dummylogger import DummyLogRequest
+from pylogger.fakedao import FakeDao
+from pylogger.sampling import NonDefaultResultOnly
+from pylogger.spool import Spool, SpoolingLogger
+from pylogger.typecodes import TypeCodeRefresher, TypeCodesCache
+
+
+class TypeCodesCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_store_and_load(self):
+        cache = TypeCodesCache(os.path.join(self.tmp_dir, 'codes.json'))
+        Logger(FakeDao(), type_codes_cache=cache)
+        dao = FakeDao()
+        logger = Logger(dao, type_codes_cache=cache)
+        self.assertEqual(dao.calls['getServices'], 0)
+        self.assertEqual(logger.request_type_codes['EPP']['DomainInfo'], (1, 1002))
+
+    def test_unwritable_cache(self):
+        cache = TypeCodesCache(os.path.join(self.tmp_dir, 'missing', 'codes.json'))
+        for logger_class in (Logger, LoggerFailSilent):
+            logger = logger_class(FakeDao(), type_codes_cache=cache)
+            self.assertEqual(logger.request_type_codes['EPP']['DomainInfo'], (1, 1002))
+
+
+class LazyTypeCodesTest(unittest.TestCase):
+    def test_failed_load_retried(self):
+        dao = FakeDao()
+        logger = Logger(dao, lazy_type_codes=True)
+        dao.failure_rate = 1
+        with self.assertRaises(Exception):
+            logger.request_type_codes['EPP']
+        dao.failure_rate = 0
+        self.assertEqual(logger.request_type_codes['EPP']['DomainInfo'], (1, 1002))
+        self.assertEqual(logger.result_codes['EPP']['Success'], 1001)
+
+
+class TypeCodesReloadTest(unittest.TestCase):
+    def test_set_codes(self):
+        logger = Logger(FakeDao())
+        generation = logger.type_codes.generation
+        logger.request_type_codes = {'EPP': {'DomainInfo': (1, 7)}}
+        logger.result_codes = {'EPP': {'Success': 8}}
+        self.assertEqual(logger._get_request_type_code('EPP', 'DomainInfo'), (1, 7))
+        self.assertEqual(logger._get_result_code('EPP', 'Success'), 8)
+        self.assertEqual(logger.type_codes.generation, generation + 2)
+
+    def test_reload(self):
+        dao = FakeDao()
+        logger = Logger(dao)
+        registry = logger.type_codes
+        dao.request_types.append('KeysetInfo')
+        self.assertIsNot(logger.reload_type_codes(), registry)
+        self.assertEqual(logger.type_codes.generation, registry.generation + 1)
+        self.assertEqual(logger.request_type_codes['EPP']['KeysetInfo'], (1, 1007))
+        self.assertNotIn('KeysetInfo', registry.request_type_codes['EPP'])
+
+    def test_reload_on_miss(self):
+        dao = FakeDao()
+        logger = Logger(dao)
+        logger.type_codes.loaded = 0
+        dao.request_types.append('KeysetInfo')
+        self.assertEqual(logger._get_request_type_code('EPP', 'KeysetInfo'), (1, 1007))
+
+    def test_min_reload_interval(self):
+        dao = FakeDao()
+        logger = Logger(dao)
+        calls = dao.calls['getServices']
+        with self.assertRaises(ValueError):
+            logger._get_request_type_code('EPP', 'Unknown')
+        self.assertEqual(dao.calls['getServices'], calls)
+
+    def test_concurrent_reloads_coalesced(self):
+        dao = FakeDao(latency=0.01)
+        logger = Logger(dao)
+        logger.type_codes.loaded = 0
+        calls = dao.calls['getServices']
+        errors = []
+
+        def lookup():
+            try:
+                logger._get_request_type_code('EPP', 'Unknown')
+            except ValueError as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=lookup) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(len(errors), 10)
+        self.assertEqual(dao.calls['getServices'], calls + 1)
+
+
+class TypeCodeRefresherTest(unittest.TestCase):
+    def test_trigger(self):
+        reloaded = threading.Event()
+        refresher = TypeCodeRefresher(reloaded.set)
+        refresher.start()
+        self.assertFalse(reloaded.wait(0.05))
+        refresher.trigger()
+        self.assertTrue(reloaded.wait(5))
+        refresher.stop(5)
+
+    def test_interval(self):
+        reloads = []
+        refresher = TypeCodeRefresher(lambda: reloads.append(1), interval=0.01)
+        refresher.start()
+        time.sleep(0.2)
+        refresher.stop(5)
+        self.assertGreater(len(reloads), 1)
+
+    def test_reload_error(self):
+        reloaded = threading.Event()
+
+        def reload():
+            reloaded.set()
+            raise RuntimeError('Server down.')
+
+        refresher = TypeCodeRefresher(reload, interval=0.01)
+        refresher.start()
+        self.assertTrue(reloaded.wait(5))
+        # The thread survives errors of the reload.
+        reloaded.clear()
+        self.assertTrue(reloaded.wait(5))
+        refresher.stop(5)
+
+
+class RequestTemplateFailSilentTest(unittest.TestCase):
+    def test_unknown_request_type(self):
+        logger = LoggerFailSilent(FakeDao())
+        template = logger.template('EPP', 'Unknown')
+        self.assertIsInstance(template('127.0.0.1'), DummyLogRequest)
+
+    def test_server_down(self):
+        dao = FakeDao()
+        logger = LoggerFailSilent(dao, lazy_type_codes=True)
+        dao.failure_rate = 1
+        template = logger.template('EPP', 'DomainInfo')
+        self.assertIsInstance(template('127.0.0.1'), DummyLogRequest)
+        # Codes are resolved once the server is back.
+        dao.failure_rate = 0
+        request = template('127.0.0.1')
+        self.assertNotIsInstance(request, DummyLogRequest)
+        request.close(result='Success')
+        self.assertEqual(dao.requests, {request.request_id: 'closed'})
+
+
+class DummyLogRequestTest(unittest.TestCase):
+    def test_set_attributes(self):
+        request = DummyLogRequest()
+        request.request_id = 42
+        request.service = 'EPP'
+        request.request_type = 'DomainInfo'
+        request.result = 'Success'
+        self.assertEqual((request.request_id, request.service, request.request_type, request.result), (0, '', '', ''))
+
+
+class DeferredLogRequestTest(unittest.TestCase):
+    def test_unknown_request_type(self):
+        dao = FakeDao()
+        with self.assertRaises(ValueError):
+            Logger(dao).create_request('127.0.0.1', 'EPP', 'Unknown', deferred=True)
+        request = LoggerFailSilent(dao).create_request('127.0.0.1', 'EPP', 'Unknown', deferred=True)
+        self.assertIsInstance(request, DummyLogRequest)
+
+    def test_no_dict(self):
+        logger = Logger(FakeDao(), policies={('EPP', 'DomainInfo'): NonDefaultResultOnly()})
+        self.assertFalse(hasattr(logger.create_request('127.0.0.1', 'EPP', 'DomainInfo'), '__dict__'))
+        self.assertFalse(hasattr(logger.create_request('127.0.0.1', 'EPP', 'Login', deferred=True), '__dict__'))
+
+
+class AddRequestPropertiesFakeDao(FakeDao):
+    def addRequestProperties(self, request_id, properties, references):
+        self._call('addRequestProperties')
+
+
+class AddPropertiesTest(unittest.TestCase):
+    def setUp(self):
+        self.dao = AddRequestPropertiesFakeDao()
+
+    def _add(self, request):
+        request.add_properties([['handle', 'example%d.cz' % number] for number in range(5)])
+
+    def test_created(self):
+        logger = Logger(self.dao)
+        logger.property_chunk_size = 2
+        self._add(logger.create_request('127.0.0.1', 'EPP', 'DomainInfo'))
+        self.assertEqual(self.dao.calls['addRequestProperties'], 1)
+
+    def test_deferred(self):
+        logger = Logger(self.dao)
+        logger.property_chunk_size = 2
+        request = logger.create_request('127.0.0.1', 'EPP', 'DomainInfo', deferred=True)
+        self._add(request)
+        self.assertEqual(self.dao.calls['createRequest'], 0)
+        self.assertEqual(self.dao.calls['addRequestProperties'], 0)
+        request.close(result='Success')
+        self.assertEqual(self.dao.requests, {request.request_id: 'closed'})
+
+    def test_deferred_fail_silent(self):
+        logger = LoggerFailSilent(self.dao, policies={('EPP', 'Login'): NonDefaultResultOnly()})
+        for request_type in ('DomainInfo', 'Login'):
+            request = logger.create_request('127.0.0.1', 'EPP', request_type, deferred=True)
+            request.add_properties([['only-name']])
+            request.add_references([['domain']])
+        with self.assertRaises(IndexError):
+            Logger(self.dao).create_request('127.0.0.1', 'EPP', 'DomainInfo', deferred=True).add_properties(
+                [['only-name']])
+
+    def test_spooled(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        logger = SpoolingLogger(self.dao, Spool(tmp_dir), defer=True)
+        logger.property_chunk_size = 2
+        request = logger.create_request('127.0.0.1', 'EPP', 'DomainInfo')
+        self._add(request)
+        self.assertLess(request.request_id, 0)
+        self.assertEqual(self.dao.calls['addRequestProperties'], 0)
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    def _failing_logger(self, **kwargs):
+        dao = FakeDao(failure_rate=1, fail_methods=['closeRequest'])
+        circuit_breaker = CircuitBreaker(window_size=5, min_calls=5, reset_timeout=60)
+        return dao, LoggerFailSilent(dao, circuit_breaker=circuit_breaker, **kwargs)
+
+    def test_close(self):
+        dao, logger = self._failing_logger()
+        for _ in range(10):
+            logger.create_request('127.0.0.1', 'EPP', 'DomainInfo').close()
+        self.assertEqual(logger.circuit_breaker.state, breaker.OPEN)
+        self.assertLess(dao.calls['closeRequest'], 10)
+
+    def test_deferred_close(self):
+        dao, logger = self._failing_logger()
+        for _ in range(10):
+            logger.create_request('127.0.0.1', 'EPP', 'DomainInfo', deferred=True).close()
+        self.assertEqual(logger.circuit_breaker.state, breaker.OPEN)
+        self.assertLess(dao.calls['closeRequest'], 10)
+
+    def test_type_codes_reload(self):
+        dao, logger = self._failing_logger()
+        logger.type_codes_min_reload_interval = 0
+        for _ in range(10):
+            logger.create_request('127.0.0.1', 'EPP', 'DomainInfo').close()
+        self.assertEqual(logger.circuit_breaker.state, breaker.OPEN)
+        calls = dao.calls['getServices']
+        self.assertIsInstance(logger.template('EPP', 'Unknown')('127.0.0.1'), DummyLogRequest)
+        self.assertIsInstance(logger.create_request('127.0.0.1', 'EPP', 'Unknown'), DummyLogRequest)
+        self.assertEqual(dao.calls['getServices'], calls)
+
+    def test_conditional_close(self):
+        dao, logger = self._failing_logger(policies={('EPP', None): NonDefaultResultOnly()})
+        for _ in range(10):
+            logger.create_request('127.0.0.1', 'EPP', 'DomainInfo').close(result='Success')
+        self.assertEqual(logger.circuit_breaker.state, breaker.OPEN)
+        self.assertLess(dao.calls['closeRequest'], 10)
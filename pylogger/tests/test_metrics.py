@@ -0,0 +1,118 @@
+#
+# Copyright (C) 2022  CZ.NIC, z. s. p. o.
+#
+# This file is part of FRED.
+#
+# FRED is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# FRED is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with FRED.  If not, see <https://www.gnu.org/licenses/>.
+"""Tests of DaoMetrics."""
+from __future__ import unicode_literals
+
+import unittest
+
+from pylogger.corbalogger import Logger
+from pylogger.fakedao import FakeDao, FakeDaoError
+from pylogger.metrics import DaoMetrics, format_prometheus, format_statsd
+
+INF = float('inf')
+
+
+class DaoMetricsTest(unittest.TestCase):
+    def test_call(self):
+        metrics = DaoMetrics()
+        self.assertEqual(metrics.call(lambda a, b: a + b, 'createRequest', 'EPP', 'DomainInfo', 1, 2), 3)
+        stats = metrics.snapshot()[('createRequest', 'EPP', 'DomainInfo')]
+        self.assertEqual(stats['count'], 1)
+        self.assertEqual(stats['errors'], 0)
+        self.assertGreaterEqual(stats['sum'], 0)
+
+    def test_call_error(self):
+        metrics = DaoMetrics()
+
+        def fail():
+            raise FakeDaoError('Gazpacho!')
+
+        with self.assertRaises(FakeDaoError):
+            metrics.call(fail, 'closeRequest', 'EPP', 'DomainInfo')
+        stats = metrics.snapshot()[('closeRequest', 'EPP', 'DomainInfo')]
+        self.assertEqual(stats['count'], 1)
+        self.assertEqual(stats['errors'], 1)
+
+    def test_buckets(self):
+        metrics = DaoMetrics(buckets=(0.1, 1.0))
+        # Durations equal to the upper bound fall into its bucket.
+        for duration in (0.05, 0.1, 0.5, 1.0, 1.5, 20):
+            metrics.observe('createRequest', 'EPP', 'DomainInfo', duration)
+        self.assertEqual(metrics._stats[('createRequest', 'EPP', 'DomainInfo')].buckets, [2, 2, 2])
+
+    def test_snapshot(self):
+        metrics = DaoMetrics(buckets=(0.1, 1.0))
+        metrics.observe('createRequest', 'EPP', 'DomainInfo', 0.05)
+        metrics.observe('createRequest', 'EPP', 'DomainInfo', 0.5, error=True)
+        metrics.observe('createRequest', 'EPP', 'DomainInfo', 0.5)
+        metrics.observe('createSession', '', '', 2)
+        self.assertEqual(metrics.snapshot(), {
+            ('createRequest', 'EPP', 'DomainInfo'): {
+                'count': 3, 'errors': 1, 'sum': 1.05, 'buckets': [(0.1, 1), (1.0, 3), (INF, 3)]},
+            ('createSession', '', ''): {'count': 1, 'errors': 0, 'sum': 2, 'buckets': [(0.1, 0), (1.0, 0), (INF, 1)]},
+        })
+        metrics.reset()
+        self.assertEqual(metrics.snapshot(), {})
+
+    def test_logger(self):
+        metrics = DaoMetrics()
+        logger = Logger(FakeDao(), metrics=metrics)
+        request = logger.create_request('127.0.0.1', 'EPP', 'DomainInfo')
+        request.close(result='Success')
+        counts = dict((key, stats['count']) for key, stats in metrics.snapshot().items())
+        self.assertEqual(counts[('createRequest', 'EPP', 'DomainInfo')], 1)
+        self.assertEqual(counts[('closeRequest', 'EPP', 'DomainInfo')], 1)
+
+
+class FormatTest(unittest.TestCase):
+    def setUp(self):
+        self.metrics = DaoMetrics(buckets=(0.1, 1.0))
+        self.metrics.observe('createRequest', 'EPP', 'Domain "Info"', 0.5, error=True)
+        self.metrics.observe('createSession', '', '', 0.25)
+
+    def test_prometheus(self):
+        labels = 'method="createRequest",service="EPP",request_type="Domain \\"Info\\""'
+        session_labels = 'method="createSession",service="",request_type=""'
+        self.assertEqual(format_prometheus(self.metrics).splitlines(), [
+            '# HELP pylogger_dao_call_duration_seconds Duration of logger DAO calls.',
+            '# TYPE pylogger_dao_call_duration_seconds histogram',
+            'pylogger_dao_call_duration_seconds_bucket{%s,le="0.1"} 0' % labels,
+            'pylogger_dao_call_duration_seconds_bucket{%s,le="1.0"} 1' % labels,
+            'pylogger_dao_call_duration_seconds_bucket{%s,le="+Inf"} 1' % labels,
+            'pylogger_dao_call_duration_seconds_sum{%s} 0.5' % labels,
+            'pylogger_dao_call_duration_seconds_count{%s} 1' % labels,
+            'pylogger_dao_call_duration_seconds_bucket{%s,le="0.1"} 0' % session_labels,
+            'pylogger_dao_call_duration_seconds_bucket{%s,le="1.0"} 1' % session_labels,
+            'pylogger_dao_call_duration_seconds_bucket{%s,le="+Inf"} 1' % session_labels,
+            'pylogger_dao_call_duration_seconds_sum{%s} 0.25' % session_labels,
+            'pylogger_dao_call_duration_seconds_count{%s} 1' % session_labels,
+            '# HELP pylogger_dao_call_errors_total Number of failed logger DAO calls.',
+            '# TYPE pylogger_dao_call_errors_total counter',
+            'pylogger_dao_call_errors_total{%s} 1' % labels,
+            'pylogger_dao_call_errors_total{%s} 0' % session_labels,
+        ])
+
+    def test_statsd(self):
+        self.assertEqual(format_statsd(self.metrics, prefix='fred'), [
+            'fred.createRequest.EPP.Domain_"Info".count:1|g',
+            'fred.createRequest.EPP.Domain_"Info".errors:1|g',
+            'fred.createRequest.EPP.Domain_"Info".duration_ms:500.000000|g',
+            'fred.createSession.none.none.count:1|g',
+            'fred.createSession.none.none.errors:0|g',
+            'fred.createSession.none.none.duration_ms:250.000000|g',
+        ])
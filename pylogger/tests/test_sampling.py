@@ -0,0 +1,126 @@
+#
+# Copyright (C) 2022  CZ.NIC, z. s. p. o.
+#
+# This file is part of FRED.
+#
+# FRED is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# FRED is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with FRED.  If not, see <https://www.gnu.org/licenses/>.
+"""Tests of sampling policies applied by loggers and templates."""
+from __future__ import unicode_literals
+
+import shutil
+import tempfile
+import unittest
+
+from pylogger.background import BackgroundLogger
+from pylogger.corbalogger import Logger, LoggerFailSilent
+from pylogger.dummylogger import DummyLogRequest
+from pylogger.fakedao import FakeDao
+from pylogger.sampling import DROP, LOG, NonDefaultResultOnly, SampleOneInN, SamplingPolicy, TokenBucket
+from pylogger.spool import Spool, SpoolingLogger
+
+
+class DropAll(SamplingPolicy):
+    def decide(self):
+        return DROP
+
+
+class SamplingPolicyTest(unittest.TestCase):
+    def test_default(self):
+        policy = SamplingPolicy()
+        self.assertEqual(policy.decide(), LOG)
+        self.assertEqual(policy.stats(), {'logged': 1, 'dropped': 0})
+
+    def test_one_in_n(self):
+        policy = SampleOneInN(3)
+        self.assertEqual([policy.decide() for _ in range(6)], [LOG, DROP, DROP, LOG, DROP, DROP])
+        self.assertEqual(policy.stats(), {'logged': 2, 'dropped': 4})
+        self.assertEqual([SampleOneInN(1).decide() for _ in range(2)], [LOG, LOG])
+
+    def test_one_in_n_invalid(self):
+        with self.assertRaises(ValueError):
+            SampleOneInN(0)
+
+    def test_token_bucket(self):
+        policy = TokenBucket(rate=0.001, burst=2)
+        self.assertEqual([policy.decide() for _ in range(3)], [LOG, LOG, DROP])
+        self.assertEqual(policy.stats(), {'logged': 2, 'dropped': 1})
+
+
+class TemplateSamplingTest(unittest.TestCase):
+    def test_drop(self):
+        for logger_class in (Logger, LoggerFailSilent):
+            dao = FakeDao()
+            logger = logger_class(dao, policies={('EPP', None): DropAll()})
+            request = logger.template('EPP', 'DomainInfo')('127.0.0.1')
+            self.assertIsInstance(request, DummyLogRequest)
+            self.assertEqual(dao.calls['createRequest'], 0)
+
+    def test_defer(self):
+        dao = FakeDao()
+        logger = Logger(dao, policies={('EPP', None): NonDefaultResultOnly()})
+        template = logger.template('EPP', 'DomainInfo', static_properties=[['server', 'epp1']])
+        template('127.0.0.1').close(result='CommandFailed')
+        self.assertEqual(dao.calls['createRequest'], 0)
+        request = template('127.0.0.1', [['handle', 'example.cz']])
+        request.close(result='Success')
+        self.assertEqual(dao.calls['createRequest'], 1)
+        self.assertEqual(dao.requests, {request.request_id: 'closed'})
+
+
+class BackgroundSamplingTest(unittest.TestCase):
+    def setUp(self):
+        self.dao = FakeDao()
+        self.logger = BackgroundLogger(self.dao, policies={('EPP', None): NonDefaultResultOnly()})
+
+    def tearDown(self):
+        self.logger.shutdown()
+
+    def test_drop(self):
+        self.logger.set_policy('EPP', 'DomainInfo', DropAll())
+        request = self.logger.create_request('127.0.0.1', 'EPP', 'DomainInfo')
+        self.assertIsInstance(request, DummyLogRequest)
+
+    def test_defer(self):
+        request = self.logger.create_request('127.0.0.1', 'EPP', 'DomainInfo')
+        self.assertEqual(request.request_id, 0)
+        request.close(result='CommandFailed')
+        logged = self.logger.create_request('127.0.0.1', 'EPP', 'DomainInfo')
+        logged.close(result='Success')
+        self.assertTrue(self.logger.flush(timeout=5))
+        self.assertEqual(self.dao.calls['createRequest'], 1)
+        self.assertEqual(self.dao.requests, {logged.request_id: 'closed'})
+
+
+class SpoolSamplingTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_drop(self):
+        dao = FakeDao()
+        logger = SpoolingLogger(dao, Spool(self.tmp_dir), policies={('EPP', None): DropAll()})
+        self.assertIsInstance(logger.create_request('127.0.0.1', 'EPP', 'DomainInfo'), DummyLogRequest)
+        self.assertEqual(dao.calls['createRequest'], 0)
+
+    def test_defer_spooled(self):
+        dao = FakeDao(failure_rate=1, fail_methods=['closeRequest'])
+        spool = Spool(self.tmp_dir)
+        logger = SpoolingLogger(dao, spool, policies={('EPP', None): NonDefaultResultOnly()})
+        request = logger.create_request('127.0.0.1', 'EPP', 'DomainInfo')
+        request.close(result='Success')
+        self.assertEqual(dao.requests, {request.request_id: 'open'})
+        spool.rotate()
+        self.assertEqual(len(spool.closed_segments()), 1)
@@ -0,0 +1,136 @@
+#
+# Copyright (C) 2022  CZ.NIC, z. s. p. o.
+#
+# This file is part of FRED.
+#
+# FRED is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# FRED is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with FRED.  If not, see <https://www.gnu.org/licenses/>.
+"""Tests of SessionCache."""
+from __future__ import unicode_literals
+
+import itertools
+import time
+import unittest
+
+from pylogger.corbalogger import Logger
+from pylogger.fakedao import FakeDao
+from pylogger.sessions import SessionCache
+
+
+class SessionCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = SessionCache(idle_timeout=60)
+        self._ids = itertools.count(1)
+
+    def start(self):
+        return next(self._ids)
+
+    def test_refcount(self):
+        session_id = self.cache.acquire(1, 'user', self.start)
+        self.assertEqual(self.cache.acquire(1, 'user', self.start), session_id)
+        self.assertNotEqual(self.cache.acquire(2, 'other', self.start), session_id)
+        self.assertTrue(self.cache.release(session_id))
+        # The session is still used.
+        self.assertEqual(self.cache.pop_expired(idle_timeout=0), [])
+        self.assertTrue(self.cache.release(session_id))
+        self.assertEqual(self.cache.pop_expired(idle_timeout=0), [session_id])
+        self.assertEqual(self.cache.stats(), {'open': 1, 'started': 2, 'reused': 1, 'expired': 1})
+
+    def test_double_release(self):
+        session_id = self.cache.acquire(1, 'user', self.start)
+        self.assertTrue(self.cache.release(session_id))
+        with self.assertLogs('pylogger.sessions', 'WARNING'):
+            self.assertTrue(self.cache.release(session_id))
+        # The double release doesn't prevent the next user from keeping the session open.
+        self.assertEqual(self.cache.acquire(1, 'user', self.start), session_id)
+        self.assertEqual(self.cache.pop_expired(idle_timeout=0), [])
+
+    def test_release_unknown(self):
+        self.assertFalse(self.cache.release(42))
+
+    def test_failed_start(self):
+        self.assertEqual(self.cache.acquire(1, 'user', lambda: 0), 0)
+        self.assertEqual(self.cache.stats()['open'], 0)
+
+    def test_duplicate_start(self):
+        inner_ids = []
+
+        def start():
+            # Other thread starts a session of the same user meanwhile.
+            inner_ids.append(self.cache.acquire(1, 'user', self.start))
+            return self.start()
+
+        session_id = self.cache.acquire(1, 'user', start)
+        self.assertEqual(inner_ids, [session_id])
+        self.assertTrue(self.cache.release(session_id))
+        # The duplicate session is closed, the shared one is kept.
+        self.assertEqual(self.cache.pop_expired(), [2])
+        self.assertTrue(self.cache.release(session_id))
+        self.assertEqual(self.cache.pop_expired(idle_timeout=0), [session_id])
+
+    def test_idle_expiry(self):
+        session_id = self.cache.acquire(1, 'user', self.start)
+        self.cache.release(session_id)
+        self.assertEqual(self.cache.pop_expired(), [])
+        self.cache._by_id[session_id].last_used -= 60
+        self.assertEqual(self.cache.pop_expired(), [session_id])
+        self.assertEqual(self.cache.stats()['expired'], 1)
+        # Expired session is not reused.
+        self.assertNotEqual(self.cache.acquire(1, 'user', self.start), session_id)
+
+    def test_sweeper(self):
+        closed = []
+        cache = SessionCache(idle_timeout=0.01, sweep_interval=0.01)
+        cache.start(closed.append)
+        self.addCleanup(cache.stop)
+        session_id = cache.acquire(1, 'user', self.start)
+        cache.release(session_id)
+        for _ in range(100):
+            if closed:
+                break
+            time.sleep(0.01)
+        self.assertEqual(closed, [session_id])
+
+    def test_sweeper_error(self):
+        def close(session_id):
+            raise ValueError('Gazpacho!')
+
+        session_id = self.cache.acquire(1, 'user', self.start)
+        self.cache.release(session_id)
+        with self.assertLogs('pylogger.sessions', 'ERROR'):
+            self.cache.sweep(close, idle_timeout=0)
+
+    def test_stop(self):
+        closed = []
+        self.cache.start(closed.append)
+        unused = self.cache.acquire(1, 'user', self.start)
+        self.cache.release(unused)
+        used = self.cache.acquire(2, 'other', self.start)
+        self.cache.stop()
+        self.assertEqual(closed, [unused])
+        # Once the sweeper is stopped, the released session has to be closed by the caller.
+        self.assertFalse(self.cache.release(used))
+        self.assertEqual(self.cache.stats()['open'], 0)
+
+    def test_logger(self):
+        dao = FakeDao()
+        cache = SessionCache(idle_timeout=60)
+        logger = Logger(dao, session_cache=cache)
+        session_id = logger.acquire_session(1, 'user')
+        self.assertEqual(logger.acquire_session(1, 'user'), session_id)
+        logger.release_session(session_id)
+        logger.release_session(session_id)
+        self.assertEqual(dao.sessions, {session_id: 'open'})
+        cache.stop()
+        self.assertEqual(dao.sessions, {session_id: 'closed'})
+        self.assertEqual(dao.calls['createSession'], 1)
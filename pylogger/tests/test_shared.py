@@ -0,0 +1,75 @@
+#
+# Copyright (C) 2022  CZ.NIC, z. s. p. o.
+#
+# This file is part of FRED.
+#
+# FRED is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# FRED is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with FRED.  If not, see <https://www.gnu.org/licenses/>.
+"""Tests of SharedLogger."""
+from __future__ import unicode_literals
+
+import gc
+import os
+import unittest
+import weakref
+
+from pylogger.background import BackgroundLogger
+from pylogger.breaker import CircuitBreaker
+from pylogger.fakedao import FakeDao
+from pylogger.metrics import DaoMetrics
+from pylogger.sampling import NonDefaultResultOnly
+from pylogger.shared import SharedLogger
+
+
+class SharedLoggerTest(unittest.TestCase):
+    def test_after_fork(self):
+        policy = NonDefaultResultOnly()
+        shared_logger = SharedLogger(FakeDao, metrics=DaoMetrics(), circuit_breaker=CircuitBreaker(),
+                                     policies={('EPP', None): policy})
+        logger = shared_logger.get_logger()
+        # Locks held by threads of the parent, which don't run in the child.
+        locks = [logger._services_lock, logger._reload_lock, logger.metrics._lock, logger.circuit_breaker._lock,
+                 policy._lock]
+        for lock in locks:
+            lock.acquire()
+        shared_logger._after_fork()
+        for lock in (logger._services_lock, logger._reload_lock, logger.metrics._lock, logger.circuit_breaker._lock,
+                     policy._lock):
+            self.assertTrue(lock.acquire(False))
+            lock.release()
+        self.assertIs(shared_logger.get_logger(), logger)
+        for lock in locks:
+            lock.release()
+
+    def test_not_kept_alive(self):
+        reference = weakref.ref(SharedLogger(FakeDao))
+        gc.collect()
+        self.assertIsNone(reference())
+
+    @unittest.skipUnless(hasattr(os, 'fork') and hasattr(os, 'register_at_fork'), 'Requires os.register_at_fork.')
+    def test_fork_background_logger(self):
+        shared_logger = SharedLogger(FakeDao, logger_class=BackgroundLogger, request_id_timeout=5)
+        shared_logger.get_logger()
+        pid = os.fork()
+        if pid == 0:
+            status = 1
+            try:
+                logger = shared_logger.get_logger()
+                request = logger.create_request('127.0.0.1', 'EPP', 'DomainInfo')
+                request.close(result='Success')
+                if request.request_id and logger.flush(timeout=5):
+                    status = 0
+            finally:
+                os._exit(status)
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(status, 0)
@@ -0,0 +1,75 @@
+#
+# Copyright (C) 2022  CZ.NIC, z. s. p. o.
+#
+# This file is part of FRED.
+#
+# FRED is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# FRED is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with FRED.  If not, see <https://www.gnu.org/licenses/>.
+"""Tests of Spool and SpoolingLogger."""
+from __future__ import unicode_literals
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from pylogger.fakedao import FakeDao
+from pylogger.spool import Spool, SpoolingLogger, SpoolLockedError, SpoolReplayer, take_over_spools
+
+
+class SpoolTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_locked(self):
+        spool = Spool(self.tmp_dir)
+        with self.assertRaises(SpoolLockedError):
+            Spool(self.tmp_dir)
+        spool.close()
+        Spool(self.tmp_dir).close()
+
+    def test_deferred(self):
+        dao = FakeDao(failure_rate=1, fail_methods=['closeRequest'])
+        spool = Spool(self.tmp_dir)
+        logger = SpoolingLogger(dao, spool)
+        request = logger.create_request('127.0.0.1', 'EPP', 'DomainInfo', deferred=True)
+        self.assertEqual(dao.calls['createRequest'], 0)
+        request.close(result='Success')
+        # Failed close is spooled.
+        self.assertEqual(dao.requests, {request.request_id: 'open'})
+        spool.rotate()
+        self.assertEqual(len(spool.closed_segments()), 1)
+        spool.close()
+
+    def test_take_over_spools(self):
+        live_directory = os.path.join(self.tmp_dir, 'worker-1')
+        dead_directory = os.path.join(self.tmp_dir, 'worker-2')
+        os.mkdir(live_directory)
+        os.mkdir(dead_directory)
+        live_spool = Spool(live_directory)
+        # Spool of a dead process, which failed to create a request.
+        dead_spool = Spool(dead_directory)
+        logger = SpoolingLogger(FakeDao(), dead_spool, defer=True)
+        logger.create_request('127.0.0.1', 'EPP', 'DomainInfo').close(result='Success')
+        dead_spool.close()
+
+        spools = take_over_spools(self.tmp_dir)
+        self.assertEqual([spool.directory for spool in spools], [dead_directory])
+        dao = FakeDao()
+        self.assertTrue(SpoolReplayer(spools[0], dao).replay())
+        spools[0].close()
+        live_spool.close()
+        self.assertEqual(list(dao.requests.values()), ['closed'])
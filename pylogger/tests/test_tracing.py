@@ -0,0 +1,128 @@
+#
+# Copyright (C) 2022  CZ.NIC, z. s. p. o.
+#
+# This file is part of FRED.
+#
+# FRED is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# FRED is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with FRED.  If not, see <https://www.gnu.org/licenses/>.
+"""Tests of tracers."""
+from __future__ import unicode_literals
+
+import time
+import unittest
+
+from pylogger.corbalogger import Logger
+from pylogger.fakedao import FakeDao
+from pylogger.tracing import (CONVERT_PROPERTIES, CONVERT_REFERENCES, DAO_CALL, LOOKUP_CODES, RingBufferTracer,
+                              SpanTracer, Trace, Tracer)
+
+
+def _make_trace(operation, service, request_type, duration, phases):
+    trace = Trace(operation, {'service': service, 'request_type': request_type})
+    trace.start_time = 1000.0
+    trace.duration = duration
+    trace.phases = phases
+    return trace
+
+
+class TraceTest(unittest.TestCase):
+    def test_phases(self):
+        trace = Trace('create_request', {'service': 'EPP'})
+        time.sleep(0.01)
+        trace.phase('first')
+        time.sleep(0.02)
+        trace.phase('second')
+        trace.phase('third')
+        trace.finish()
+
+        self.assertEqual([name for name, _, _ in trace.phases], ['first', 'second', 'third'])
+        (_, first_offset, first), (_, second_offset, second), (_, third_offset, third) = trace.phases
+        self.assertEqual(first_offset, 0)
+        self.assertGreaterEqual(first, 0.01)
+        # Phases follow each other.
+        self.assertEqual(second_offset, first)
+        self.assertGreaterEqual(second, 0.02)
+        self.assertAlmostEqual(third_offset, first + second)
+        self.assertGreaterEqual(trace.duration, third_offset + third)
+
+
+class RingBufferTracerTest(unittest.TestCase):
+    def test_size(self):
+        tracer = RingBufferTracer(size=2)
+        traces = [_make_trace('create_request', 'EPP', 'DomainInfo', 1.0, []) for _ in range(3)]
+        for trace in traces:
+            tracer.record(trace)
+        self.assertEqual(tracer.snapshot(), traces[1:])
+
+    def test_summary(self):
+        tracer = RingBufferTracer()
+        tracer.record(_make_trace('create_request', 'EPP', 'DomainInfo', 1.0, [('a', 0.0, 0.25), ('b', 0.25, 0.5)]))
+        tracer.record(_make_trace('create_request', 'EPP', 'DomainInfo', 2.0, [('a', 0.0, 0.5)]))
+        tracer.record(_make_trace('create_request', 'EPP', 'DomainCreate', 0.5, [('a', 0.0, 0.5)]))
+        tracer.record(Trace('start_session', {}))
+        tracer.traces[-1].duration = 0.25
+        self.assertEqual(tracer.summary(), {
+            ('create_request', 'EPP', 'DomainInfo'): {'count': 2, 'total': 3.0, 'phases': {'a': 0.75, 'b': 0.5}},
+            ('create_request', 'EPP', 'DomainCreate'): {'count': 1, 'total': 0.5, 'phases': {'a': 0.5}},
+            ('start_session', '', ''): {'count': 1, 'total': 0.25, 'phases': {}},
+        })
+
+    def test_logger(self):
+        tracer = RingBufferTracer()
+        logger = Logger(FakeDao(), tracer=tracer)
+        logger.create_request('127.0.0.1', 'EPP', 'DomainInfo', [['handle', 'example.cz']])
+        trace, = tracer.snapshot()
+        self.assertEqual(trace.operation, 'create_request')
+        self.assertEqual(trace.attributes, {'service': 'EPP', 'request_type': 'DomainInfo', 'properties': 1})
+        self.assertEqual([name for name, _, _ in trace.phases],
+                         [CONVERT_PROPERTIES, CONVERT_REFERENCES, LOOKUP_CODES, DAO_CALL])
+
+
+class SpanTracerTest(unittest.TestCase):
+    def test_spans(self):
+        trace = _make_trace('create_request', 'EPP', 'DomainInfo', 0.5, [('a', 0.0, 0.125), ('b', 0.125, 0.25)])
+        exported = []
+        SpanTracer(exported.append).record(trace)
+
+        (root, first, second), = exported
+        self.assertEqual(len(root['trace_id']), 32)
+        self.assertEqual(len(root['span_id']), 16)
+        self.assertIsNone(root['parent_span_id'])
+        for span in (first, second):
+            self.assertEqual(span['trace_id'], root['trace_id'])
+            self.assertEqual(span['parent_span_id'], root['span_id'])
+            self.assertEqual(len(span['span_id']), 16)
+        self.assertEqual(len(set(span['span_id'] for span in (root, first, second))), 3)
+        self.assertEqual([(span['name'], span['start_time_unix_nano'], span['end_time_unix_nano'], span['attributes'])
+                          for span in (root, first, second)],
+                         [('create_request', 1000000000000, 1000500000000,
+                           {'service': 'EPP', 'request_type': 'DomainInfo'}),
+                          ('a', 1000000000000, 1000125000000, {}),
+                          ('b', 1000125000000, 1000375000000, {})])
+
+
+class TracerTest(unittest.TestCase):
+    def test_default_record(self):
+        logger = Logger(FakeDao(), tracer=Tracer())
+        logger.create_request('127.0.0.1', 'EPP', 'DomainInfo').close(result='Success')
+
+    def test_record_error(self):
+        class FailingTracer(Tracer):
+            def record(self, trace):
+                raise ValueError('Gazpacho!')
+
+        dao = FakeDao()
+        logger = Logger(dao, tracer=FailingTracer())
+        with self.assertLogs('pylogger', 'ERROR'):
+            request = logger.create_request('127.0.0.1', 'EPP', 'DomainInfo')
+        self.assertEqual(dao.requests, {request.request_id: 'open'})
@@ -0,0 +1,168 @@
+#
+# Copyright (C) 2022  CZ.NIC, z. s. p. o.
+#
+# This file is part of FRED.
+#
+# FRED is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# FRED is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with FRED.  If not, see <https://www.gnu.org/licenses/>.
+"""Tracing of the cost of logger operations by their phases."""
+from __future__ import unicode_literals
+
+import os
+import time
+from collections import deque
+from timeit import default_timer
+
+__all__ = ["NullTracer", "RingBufferTracer", "SpanTracer", "Trace", "Tracer"]
+
+# Phases of the operations.
+CONVERT_PROPERTIES = 'convert_properties'
+CONVERT_REFERENCES = 'convert_references'
+LOOKUP_CODES = 'lookup_codes'
+DAO_CALL = 'dao_call'
+
+
+class Trace(object):
+    """Timed phases of a single logger operation.
+
+    Phases follow each other, each phase ends when the next one is marked.
+
+    Attributes:
+        operation: Name of the operation, e.g. 'create_request'.
+        attributes: Dictionary of attributes of the operation, e.g. service and request type.
+        start_time: Wall clock time of the start of the operation.
+        duration: Duration of the operation in seconds.
+        phases: List of (name, offset from the start, duration) of the phases.
+    """
+
+    __slots__ = ('operation', 'attributes', 'start_time', 'duration', 'phases', '_start', '_last')
+
+    def __init__(self, operation, attributes):
+        self.operation = operation
+        self.attributes = attributes
+        self.start_time = time.time()
+        self.duration = None
+        self.phases = []
+        self._start = self._last = default_timer()
+
+    def phase(self, name):
+        """End the current phase with the name."""
+        now = default_timer()
+        self.phases.append((name, self._last - self._start, now - self._last))
+        self._last = now
+
+    def finish(self):
+        """End the operation."""
+        self.duration = default_timer() - self._start
+
+
+class Tracer(object):
+    """Base class of tracers, which receive finished traces of logger operations."""
+
+    # Whether traces are collected at all.
+    enabled = True
+
+    def record(self, trace):
+        """Record the finished trace. Does nothing by default."""
+
+
+class NullTracer(Tracer):
+    """Tracer, which doesn't collect any traces."""
+
+    enabled = False
+
+
+NULL_TRACER = NullTracer()
+
+
+class RingBufferTracer(Tracer):
+    """Tracer, which keeps the last `size` traces in memory.
+
+    Example:
+        tracer = RingBufferTracer()
+        logger = Logger(dao, tracer=tracer)
+        ...
+        for key, stats in sorted(tracer.summary().items(), key=lambda item: -item[1]['total']):
+            print(key, stats)
+    """
+
+    def __init__(self, size=1000):
+        """Init RingBufferTracer.
+
+        Arguments:
+            size: Maximal number of kept traces.
+        """
+        self.traces = deque(maxlen=size)
+
+    def record(self, trace):
+        self.traces.append(trace)
+
+    def snapshot(self):
+        """Return list of the kept traces."""
+        return list(self.traces)
+
+    def summary(self):
+        """Return total durations of the kept traces.
+
+        Returns dictionary (operation, service, request type) -> {'count': ..., 'total': ..., 'phases': {...}},
+        where phases contain total duration of each phase.
+        """
+        summary = {}
+        for trace in self.snapshot():
+            key = (trace.operation, trace.attributes.get('service', ''), trace.attributes.get('request_type', ''))
+            stats = summary.setdefault(key, {'count': 0, 'total': 0.0, 'phases': {}})
+            stats['count'] += 1
+            stats['total'] += trace.duration
+            for name, _, duration in trace.phases:
+                stats['phases'][name] = stats['phases'].get(name, 0.0) + duration
+        return summary
+
+
+class SpanTracer(Tracer):
+    """Tracer, which exports traces as OpenTelemetry-style span dictionaries.
+
+    Each trace is exported as a list of spans - the operation span followed by a child span for each phase.
+
+    Example:
+        tracer = SpanTracer(exporter.export)
+        logger = Logger(dao, tracer=tracer)
+    """
+
+    def __init__(self, export):
+        """Init SpanTracer.
+
+        Arguments:
+            export: Callable, which receives the list of spans of each trace.
+        """
+        self.export = export
+
+    def record(self, trace):
+        self.export(self.spans(trace))
+
+    def spans(self, trace):
+        """Return list of span dictionaries of the trace."""
+        trace_id = self._random_id(16)
+        root_id = self._random_id(8)
+        start = int(trace.start_time * 1e9)
+        spans = [{'trace_id': trace_id, 'span_id': root_id, 'parent_span_id': None, 'name': trace.operation,
+                  'start_time_unix_nano': start, 'end_time_unix_nano': start + int(trace.duration * 1e9),
+                  'attributes': dict(trace.attributes)}]
+        for name, offset, duration in trace.phases:
+            phase_start = start + int(offset * 1e9)
+            spans.append({'trace_id': trace_id, 'span_id': self._random_id(8), 'parent_span_id': root_id,
+                          'name': name, 'start_time_unix_nano': phase_start,
+                          'end_time_unix_nano': phase_start + int(duration * 1e9), 'attributes': {}})
+        return spans
+
+    def _random_id(self, size):
+        return ''.join('%02x' % byte for byte in bytearray(os.urandom(size)))
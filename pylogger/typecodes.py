@@ -0,0 +1,204 @@
+#
+# Copyright (C) 2022  CZ.NIC, z. s. p. o.
+#
+# This file is part of FRED.
+#
+# FRED is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# FRED is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with FRED.  If not, see <https://www.gnu.org/licenses/>.
+"""Caching and lazy loading of request type codes and result codes."""
+from __future__ import unicode_literals
+
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import namedtuple
+
+__all__ = ["CachedTypeCodes", "LazyServiceCodes", "TypeCodeRefresher", "TypeCodeRegistry", "TypeCodesCache"]
+
+LOGGER = logging.getLogger(__name__)
+
+# Old service names, for which the codes are kept as well.
+OLD_SERVICE_NAMES = {'WebWhois': 'Web whois', 'PublicRequest': 'Public Request'}
+
+CachedTypeCodes = namedtuple('CachedTypeCodes', ['request_type_codes', 'result_codes', 'stale'])
+
+
+class TypeCodesCache(object):
+    """On-disk cache of request type codes and result codes.
+
+    The cache is a JSON file, which is replaced atomically on store, so it can be shared by many processes.
+    Cached codes older than `ttl` seconds are marked as stale and should be refreshed.
+
+    Example:
+        cache = TypeCodesCache('/var/cache/fred/pylogger-type-codes.json', ttl=3600)
+        logger = Logger(dao, type_codes_cache=cache)
+    """
+
+    # Version of the cache file format.
+    FORMAT = 1
+
+    def __init__(self, path, ttl=3600, version=None):
+        """Init TypeCodesCache.
+
+        Arguments:
+            path: Path to the cache file.
+            ttl: Number of seconds after which the cached codes are stale.
+            version: Version stamp of the codes, e.g. version of the logger backend.
+                Cache with a different version is ignored.
+        """
+        self.path = path
+        self.ttl = ttl
+        self.version = version
+
+    def load(self):
+        """Load the codes from the cache.
+
+        Returns CachedTypeCodes or None if the cache is missing, invalid or of other version.
+        """
+        try:
+            with open(self.path, 'rb') as cache_file:
+                data = json.loads(cache_file.read().decode('utf-8'))
+            if data['format'] != self.FORMAT or data['version'] != self.version:
+                return None
+            request_type_codes = {service: {name: tuple(codes) for name, codes in types.items()}
+                                  for service, types in data['request_type_codes'].items()}
+            result_codes = data['result_codes']
+            stale = time.time() - data['timestamp'] > self.ttl
+        except (IOError, OSError, ValueError, KeyError, TypeError, AttributeError) as error:
+            LOGGER.debug('Type codes cache %s not loaded: %s', self.path, error)
+            return None
+        return CachedTypeCodes(request_type_codes, result_codes, stale)
+
+    def store(self, request_type_codes, result_codes):
+        """Store the codes into the cache."""
+        data = {'format': self.FORMAT, 'version': self.version, 'timestamp': time.time(),
+                'request_type_codes': request_type_codes, 'result_codes': result_codes}
+        directory = os.path.dirname(os.path.abspath(self.path))
+        handle, tmp_path = tempfile.mkstemp(dir=directory, prefix='.pylogger-')
+        try:
+            with os.fdopen(handle, 'wb') as cache_file:
+                cache_file.write(json.dumps(data).encode('utf-8'))
+            os.rename(tmp_path, self.path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+
+class LazyServiceCodes(dict):
+    """Dictionary of codes by service name, which loads codes of the service on first access.
+
+    Only item access triggers the loading, `get` and `in` work only with already loaded services.
+    """
+
+    def __init__(self, loader):
+        """Init LazyServiceCodes.
+
+        Arguments:
+            loader: Callable which loads the codes of the service with the given name.
+        """
+        super(LazyServiceCodes, self).__init__()
+        self.loader = loader
+
+    def __missing__(self, service_name):
+        self.loader(service_name)
+        if service_name in self:
+            return dict.__getitem__(self, service_name)
+        raise KeyError(service_name)
+
+
+class TypeCodeRegistry(object):
+    """Request type codes and result codes loaded at once.
+
+    Registry isn't changed once it's created, except for the services loaded lazily. Reload of the codes creates
+    a new registry, which replaces the old one in a single assignment, so readers never see partially loaded codes.
+
+    Attributes:
+        request_type_codes: Dictionary service name -> request type name -> (service code, request type code).
+        result_codes: Dictionary service name -> result name -> result code.
+        generation: Number of the registry, incremented by each reload.
+        loaded: Timestamp of the load.
+    """
+
+    __slots__ = ('request_type_codes', 'result_codes', 'generation', 'loaded')
+
+    def __init__(self, request_type_codes, result_codes, generation=0, loaded=None):
+        self.request_type_codes = request_type_codes
+        self.result_codes = result_codes
+        self.generation = generation
+        self.loaded = time.time() if loaded is None else loaded
+
+
+class TypeCodeRefresher(object):
+    """Background thread, which reloads type codes on an interval or on demand.
+
+    Example:
+        refresher = TypeCodeRefresher(logger.reload_type_codes, interval=600)
+        refresher.start()
+        ...
+        refresher.trigger()
+    """
+
+    def __init__(self, reload, interval=None):
+        """Init TypeCodeRefresher.
+
+        Arguments:
+            reload: Callable, which reloads the codes.
+            interval: Number of seconds between reloads. If None, codes are reloaded only when triggered.
+        """
+        self.reload = reload
+        self.interval = interval
+        self._thread = None
+        self._condition = threading.Condition()
+        self._triggered = False
+        self._stopped = False
+
+    def start(self):
+        """Start the refresher thread, unless it's running already."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        # The thread doesn't survive fork, neither should its condition.
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name='pylogger-type-codes')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def trigger(self):
+        """Reload the codes in the background as soon as possible."""
+        with self._condition:
+            self._triggered = True
+            self._condition.notify()
+
+    def stop(self, timeout=None):
+        """Stop the refresher thread."""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if not self._triggered and not self._stopped:
+                    self._condition.wait(self.interval)
+                if self._stopped:
+                    return
+                self._triggered = False
+            try:
+                self.reload()
+            except Exception as error:
+                LOGGER.error('Logger failed to error during type codes refresh: %s.', error)
@@ -18,7 +18,24 @@
 # You should have received a copy of the GNU General Public License
 # along with FRED.  If not, see <https://www.gnu.org/licenses/>.
 
+import sys
+
 from setuptools import find_packages, setup
+from setuptools.command.build_py import build_py
+
+# Modules with Python 3 only syntax, which are not installed on Python 2.
+PY3_ONLY_MODULES = [('pylogger', 'asynclogger'), ('pylogger.tests', 'test_asynclogger')]
+
+
+class BuildPy(build_py):
+    """Build modules, skip Python 3 only modules on Python 2."""
+
+    def find_package_modules(self, package, package_dir):
+        modules = build_py.find_package_modules(self, package, package_dir)
+        if sys.version_info[0] < 3:
+            modules = [module for module in modules if module[:2] not in PY3_ONLY_MODULES]
+        return modules
+
 
 setup(name='fred-pylogger',
       version='2.0.2',
@@ -30,4 +47,5 @@ setup(name='fred-pylogger',
       platforms=['posix'],
       packages=find_packages(),
       install_requires=open('requirements.txt').read().splitlines(),
-      extras_require={'quality': ['isort', 'flake8', 'pydocstyle']})
+      extras_require={'quality': ['isort', 'flake8', 'pydocstyle']},
+      cmdclass={'build_py': BuildPy})